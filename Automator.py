@@ -3,25 +3,32 @@ import re
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
 import unicodedata
 
+from waits import StepWaiter, NEW_POST_BUTTON, FILE_INPUT, element_present, element_clickable, any_of
+from browser_actions import button_clicked, click_released, insert_text, watch_share_result, wait_for_share_result
+from session_store import SessionStore, INSTAGRAM_URL, session_active
+
 
 class InstagramAutomator:
     """
     A class to automate Instagram actions like posting, following, etc.
     """
     
-    def __init__(self, headless=False, maximize=True):
+    def __init__(self, headless=False, maximize=True, step_timeout=15, poll_interval=0.25, session_store=None,
+                 base_url=INSTAGRAM_URL):
         """
         Initialize the Instagram automator with browser settings
         
         Args:
             headless (bool): Run browser in headless mode
             maximize (bool): Maximize the browser window
+            step_timeout (float): Seconds to wait for each step's page element
+            poll_interval (float): Seconds between page element checks
+            session_store (SessionStore): Where login cookies are kept between runs
+            base_url (str): Instagram home page (overridden for local testing)
         """
         self.chrome_options = Options()
         
@@ -37,15 +44,19 @@ class InstagramAutomator:
             self.chrome_options.add_argument("--start-maximized")
             
         if headless:
-            self.chrome_options.add_argument("--headless")
+            self.chrome_options.add_argument("--headless=new")
             
         self.driver = None
         self.is_logged_in = False
+        self.waiter = StepWaiter(timeout=step_timeout, poll_interval=poll_interval)
+        self.sessions = session_store or SessionStore()
+        self.base_url = base_url
         
     def start_browser(self):
         """Start the Chrome browser with error handling"""
         try:
             self.driver = webdriver.Chrome(options=self.chrome_options)
+            self.waiter.driver = self.driver
             return self
         except Exception as e:
             print(f"Failed to start browser: {e}")
@@ -69,37 +80,46 @@ class InstagramAutomator:
             # Return a safe fallback
             return re.sub(r'[^\w\s\n#@.,!?-]', '', str(text))
         
-    def login(self, username, password, wait_after_login=5):
+    def login(self, username, password, wait_after_login=5, use_saved_session=True):
         """
         Login to Instagram with enhanced error handling
         
         Args:
             username (str): Instagram username
             password (str): Instagram password
-            wait_after_login (int): Seconds to wait after login
+            wait_after_login (int): Extra seconds allowed for the home page to appear after login
+            use_saved_session (bool): Try saved session cookies before the login form
         """
         if not self.driver:
             if not self.start_browser():
                 return None
             
         try:
-            self.driver.get("https://www.instagram.com/")
-            time.sleep(3)
+            if use_saved_session and self.sessions.restore(self.driver, username, self.base_url):
+                if session_active(self.waiter):
+                    self.sessions.save(self.driver, username)
+                    self.is_logged_in = True
+                    print("Restored saved session")
+                    return self
+                print("Saved session expired, logging in again")
+                self.sessions.clear(username)
             
-            # Accept cookies if present
-            try:
-                cookies_btn = WebDriverWait(self.driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accept') or contains(text(), 'Allow')]"))
-                )
-                cookies_btn.click()
-                time.sleep(2)
-            except:
-                pass  # No cookies dialog
+            self.driver.get(self.base_url)
+            
+            # Accept cookies if present, otherwise continue as soon as the form renders
+            cookies_xpath = "//button[contains(text(), 'Accept') or contains(text(), 'Allow')]"
+            username_xpath = "//input[@name='username']"
+            first = self.waiter.until("login_page", any_of(
+                element_clickable(cookies_xpath), element_present(username_xpath)
+            ))
+            if first.get_attribute("name") != "username":
+                try:
+                    first.click()
+                except:
+                    pass  # Cookies dialog vanished on its own
             
             # Find and fill username field
-            username_field = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.NAME, "username"))
-            )
+            username_field = self.waiter.until("username_field", element_clickable(username_xpath))
             username_field.clear()
             username_field.send_keys(username)
             
@@ -112,18 +132,14 @@ class InstagramAutomator:
             login_btn = self.driver.find_element(By.XPATH, "//button[@type='submit']")
             login_btn.click()
             
-            # Wait and check for successful login
-            time.sleep(wait_after_login)
-            
             # Check if login was successful
             try:
                 # Look for elements that indicate successful login
-                WebDriverWait(self.driver, 10).until(
-                    EC.any_of(
-                        EC.presence_of_element_located((By.XPATH, "//*[@aria-label='New post']")),
-                        EC.presence_of_element_located((By.XPATH, "//a[contains(@href, '/')]//img[@alt*='profile']"))
-                    )
-                )
+                self.waiter.until("login_result", any_of(
+                    element_present(NEW_POST_BUTTON),
+                    element_present("//a[contains(@href, '/')]//img[@alt*='profile']")
+                ), timeout=10 + wait_after_login)
+                self.sessions.save(self.driver, username)
                 self.is_logged_in = True
                 print("Successfully logged in")
                 return self
@@ -140,15 +156,16 @@ class InstagramAutomator:
             print(f"Login failed: {e}")
             return None
     
-    def create_post(self, image_path, caption, wait_between_steps=3, max_retries=3):
+    def create_post(self, image_path, caption, wait_between_steps=3, max_retries=3, share_timeout=60):
         """
         Create a new Instagram post with simplified caption handling
         
         Args:
             image_path (str): Full path to image file
             caption (str): Caption text for the post
-            wait_between_steps (int): Seconds to wait between steps
+            wait_between_steps (int): Seconds to wait before retrying a failed attempt
             max_retries (int): Maximum number of retry attempts
+            share_timeout (int): Seconds to wait for Instagram to confirm the post
         """
         if not self.driver or not self.is_logged_in:
             print("Browser not started or not logged in. Please login first.")
@@ -160,106 +177,71 @@ class InstagramAutomator:
         for attempt in range(max_retries):
             try:
                 print(f"Attempting to create post (attempt {attempt + 1}/{max_retries})")
+                self.waiter.reset()
                 
                 # Navigate to home if not already there
                 try:
                     home_btn = self.driver.find_element(By.XPATH, "//a[@href='/']")
                     home_btn.click()
-                    time.sleep(2)
                 except:
                     pass
                 
                 # Click new post button
-                new_post_btn = WebDriverWait(self.driver, 15).until(
-                    EC.element_to_be_clickable((By.XPATH, "//*[@aria-label='New post'] | //*[contains(@aria-label, 'Create')]"))
-                )
+                new_post_btn = self.waiter.until("new_post", element_clickable(
+                    "//*[@aria-label='New post'] | //*[contains(@aria-label, 'Create')]"
+                ))
                 new_post_btn.click()
-                time.sleep(wait_between_steps)
                 
                 # Upload image
-                file_input = WebDriverWait(self.driver, 15).until(
-                    EC.presence_of_element_located((By.XPATH, "//input[@type='file']"))
-                )
+                file_input = self.waiter.until("file_input", element_present(FILE_INPUT))
                 file_input.send_keys(image_path)
-                time.sleep(wait_between_steps * 2)
                 
-                # Navigate through the post creation steps
+                # Navigate through the post creation steps until the caption field shows up
+                caption_xpath = "//*[@aria-placeholder='Write a caption...']"
                 for step in range(3):  # Usually: Select -> Edit -> Share
                     try:
-                        # Look for Next button
-                        next_buttons = self.driver.find_elements(By.XPATH, "//*[text()='Next' or text()='Share']")
-                        if next_buttons:
-                            next_buttons[0].click()
-                            time.sleep(wait_between_steps)
-                        else:
-                            # Alternative method - look for buttons by role
-                            buttons = self.driver.find_elements(By.XPATH, "//button")
-                            for btn in buttons:
-                                btn_text = btn.text.strip().lower()
-                                if btn_text in ['next', 'share']:
-                                    btn.click()
-                                    time.sleep(wait_between_steps)
-                                    break
+                        # Returns the caption field, or the token of the Next button it clicked
+                        ready = self.waiter.until(f"next_{step + 1}", any_of(
+                            element_present(caption_xpath), button_clicked("next")
+                        ))
+                        if not isinstance(ready, str):
+                            break
+                        self.waiter.until(f"next_{step + 1}_advance", click_released(ready),
+                                          timeout=2, raise_on_timeout=False)
                     except Exception as e:
                         print(f"Step {step + 1} error: {e}")
                         continue
                 
-                # Add caption with simplified approach
+                # Add caption in one step; typed key by key only if that fails
                 try:
-                    self.driver.find_element("xpath", "//*[@aria-placeholder='Write a caption...']").send_keys(caption)
-                    time.sleep(wait_between_steps)
+                    caption_field = self.waiter.until("caption_field", element_present(caption_xpath))
+                    if insert_text(self.driver, caption_field, caption) != 'script':
+                        print("Caption typed with send_keys fallback")
                 except Exception as e:
                     print(f"Caption input error: {e}")
                     # Continue anyway, post might work without caption
                 
                 # Click Share button
                 try:
-                    share_buttons = self.driver.find_elements(By.XPATH, "//*[text()='Share']")
-                    if share_buttons:
-                        share_buttons[0].click()
-                    else:
-                        # Alternative method
-                        buttons = self.driver.find_elements(By.XPATH, "//button")
-                        for btn in buttons:
-                            if btn.text.strip().lower() == 'share':
-                                btn.click()
-                                break
-                    
-                    # Wait for post to complete
-                    time.sleep(wait_between_steps * 3)
-                    
-                    # Check if post was successful
-                    try:
-                        # Look for success indicators
-                        success_indicators = [
-                            "//div[contains(text(), 'Post shared')]",
-                            "//div[contains(text(), 'shared')]", 
-                            "//*[@aria-label='New post']"  # Back to main page
-                        ]
-                        
-                        for indicator in success_indicators:
-                            try:
-                                WebDriverWait(self.driver, 5).until(
-                                    EC.presence_of_element_located((By.XPATH, indicator))
-                                )
-                                print("Post created successfully")
-                                return self
-                            except:
-                                continue
-                        
-                        # If no success indicator found, assume success if no error
-                        print("Post likely created successfully")
-                        return self
-                        
-                    except Exception as e:
-                        print(f"Post verification warning: {e}")
-                        return self  # Assume success if no clear failure
-                        
+                    watch_share_result(self.driver)
+                    self.waiter.until("share", button_clicked("share"))
+                    print(f"Step waits: {self.waiter.summary()}")
                 except Exception as e:
                     print(f"Share button error: {e}")
                     if attempt < max_retries - 1:
                         continue
                     return None
+                
+                # Wait for Instagram to confirm or reject the post
+                state, text = wait_for_share_result(self.driver, share_timeout)
+                if state == 'shared':
+                    print("Post created successfully")
+                    return self
+                if state == 'failed':
+                    raise RuntimeError(f"Instagram reported: {text}")
+                # Not confirmed either way; retrying could post twice
+                print(f"Post not confirmed within {share_timeout} seconds")
+                return None
                     
             except Exception as e:
                 print(f"Post creation attempt {attempt + 1} failed: {e}")
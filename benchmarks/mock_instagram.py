@@ -0,0 +1,266 @@
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Artificial latencies in seconds. 'page' and 'login' and 'share' are applied
+# by the server; 'dialog', 'upload' and 'step' are applied in the browser.
+DEFAULT_LATENCIES = {
+    'page': 0.2,
+    'login': 0.5,
+    'dialog': 0.3,
+    'upload': 0.8,
+    'step': 0.4,
+    'share': 1.5,
+}
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Login • Instagram (mock)</title></head>
+<body>
+<form method="post" action="/accounts/login/">
+  <input name="username" type="text" placeholder="Username">
+  <input name="password" type="password" placeholder="Password">
+  <button type="submit">Log in</button>
+</form>
+</body></html>
+"""
+
+# Mirrors the hooks the uploaders rely on: aria-label='New post', a file
+# input, role=button Next/Share and a lexical caption editor.
+HOME_PAGE = """<!DOCTYPE html>
+<html><head><title>Instagram (mock)</title>
+<style>
+  body { font-family: sans-serif; margin: 0; display: flex; }
+  nav { width: 200px; padding: 20px; }
+  #dialog { margin: 20px; padding: 20px; border: 1px solid #ccc; min-width: 400px; display: none; }
+  [role=button] { display: inline-block; padding: 6px 12px; background: #0095f6; color: #fff; cursor: pointer; }
+  [data-lexical-editor] { border: 1px solid #ddd; min-height: 80px; padding: 4px; }
+</style></head>
+<body>
+<nav>
+  <a href="/">Home</a>
+  <div role="button" aria-label="New post" id="new-post">Create</div>
+</nav>
+<div id="dialog" role="dialog"></div>
+<script>
+const LATENCY = __LATENCIES__;
+const dialog = document.getElementById('dialog');
+let caption = '';
+
+function later(key, fn) { setTimeout(fn, Math.round(LATENCY[key] * 1000)); }
+function button(label, onClick) {
+  const b = document.createElement('div');
+  b.setAttribute('role', 'button');
+  b.textContent = label;
+  b.addEventListener('click', onClick);
+  return b;
+}
+function show(...nodes) { dialog.replaceChildren(...nodes); dialog.style.display = 'block'; }
+function heading(text) { const h = document.createElement('h2'); h.textContent = text; return h; }
+
+document.getElementById('new-post').addEventListener('click', () => {
+  dialog.replaceChildren(); dialog.style.display = 'none';
+  later('dialog', () => {
+    const input = document.createElement('input');
+    input.type = 'file';
+    input.accept = 'image/*';
+    input.addEventListener('change', () => later('upload', cropStep));
+    show(heading('Create new post'), input);
+  });
+});
+
+function cropStep() {
+  show(heading('Crop'), button('Next', () => later('step', editStep)));
+}
+function editStep() {
+  show(heading('Edit'), button('Next', () => later('step', captionStep)));
+}
+function captionStep() {
+  const editor = document.createElement('div');
+  editor.contentEditable = 'true';
+  editor.setAttribute('data-lexical-editor', 'true');
+  editor.setAttribute('aria-placeholder', 'Write a caption...');
+  editor.setAttribute('role', 'textbox');
+  show(heading('Create new post'), editor, button('Share', () => share(editor.innerText)));
+}
+function share(text) {
+  show(heading('Sharing'));
+  fetch('/api/share', {method: 'POST', headers: {'Content-Type': 'application/json'},
+                       body: JSON.stringify({caption: text})})
+    .then(r => r.json())
+    .then(res => {
+      const msg = document.createElement('div');
+      if (res.ok) {
+        msg.textContent = 'Your post has been shared.';
+        show(heading('Post shared'), msg);
+      } else {
+        msg.textContent = 'Your post could not be shared. Please try again.';
+        show(heading('Something went wrong'), msg);
+      }
+    });
+}
+</script>
+</body></html>
+"""
+
+
+class MockInstagramServer:
+    """
+    Local stand-in for instagram.com used to benchmark and regression-test the uploaders.
+
+    Sessions live only as long as the server, so a restart also exercises
+    the expired-session fallback.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latencies=None, fail_rate=0.0):
+        """
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind (0 picks a free one)
+            latencies (dict): Overrides for DEFAULT_LATENCIES
+            fail_rate (float): Fraction of shares that report an error
+        """
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self.fail_rate = fail_rate
+        self.sessions = set()
+        self.shared = []
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self.lock:
+            return {'shared': len(self.shared), 'failed': self.failed,
+                    'caption_lengths': [len(c) for c in self.shared]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _logged_in(self):
+                for part in self.headers.get('Cookie', '').split(';'):
+                    name, _, value = part.strip().partition('=')
+                    if name == 'sessionid' and value in server.sessions:
+                        return True
+                return False
+
+            def _send(self, status, body, content_type='text/html; charset=utf-8', headers=()):
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _redirect(self, location, headers=()):
+                self.send_response(302)
+                self.send_header('Location', location)
+                self.send_header('Content-Length', '0')
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length).decode('utf-8') if length else ''
+
+            def do_GET(self):
+                time.sleep(server.latencies['page'])
+                path = self.path.split('?', 1)[0]
+                if path == '/api/stats':
+                    self._send(200, json.dumps(server.stats()), 'application/json')
+                elif path.startswith('/accounts/login'):
+                    if self._logged_in():
+                        self._redirect('/')
+                    else:
+                        self._send(200, LOGIN_PAGE)
+                elif path == '/':
+                    if self._logged_in():
+                        self._send(200, HOME_PAGE.replace('__LATENCIES__', json.dumps(server.latencies)))
+                    else:
+                        self._redirect('/accounts/login/')
+                else:
+                    self._send(404, 'Not found', 'text/plain')
+
+            def do_POST(self):
+                path = self.path.split('?', 1)[0]
+                if path.startswith('/accounts/login'):
+                    time.sleep(server.latencies['login'])
+                    form = parse_qs(self._body())
+                    if not form.get('username') or not form.get('password'):
+                        self._send(200, LOGIN_PAGE)
+                        return
+                    token = secrets.token_hex(16)
+                    with server.lock:
+                        server.sessions.add(token)
+                    self._redirect('/', headers=[('Set-Cookie', f'sessionid={token}; Path=/; Max-Age=86400')])
+                elif path == '/api/share':
+                    time.sleep(server.latencies['share'])
+                    try:
+                        caption = json.loads(self._body() or '{}').get('caption', '')
+                    except ValueError:
+                        caption = ''
+                    ok = random.random() >= server.fail_rate
+                    with server.lock:
+                        if ok:
+                            server.shared.append(caption)
+                        else:
+                            server.failed += 1
+                    self._send(200, json.dumps({'ok': ok}), 'application/json')
+                else:
+                    self._send(404, 'Not found', 'text/plain')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local mock of the Instagram upload flow")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    for key, value in DEFAULT_LATENCIES.items():
+        parser.add_argument(f'--{key}-latency', type=float, default=value, dest=key)
+    args = parser.parse_args()
+    latencies = {key: getattr(args, key) for key in DEFAULT_LATENCIES}
+    server = MockInstagramServer(port=args.port, latencies=latencies, fail_rate=args.fail_rate)
+    print(f"Mock Instagram running at {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
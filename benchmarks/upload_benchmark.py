@@ -0,0 +1,184 @@
+"""
+End-to-end upload benchmark against the local mock Instagram site.
+
+Run from the repository root:
+    python -m benchmarks.upload_benchmark --posts 5
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.mock_instagram import MockInstagramServer, DEFAULT_LATENCIES
+from session_store import SessionStore
+
+USERNAME = "benchmark_user"
+PASSWORD = "benchmark_password"
+CAPTION = ("Benchmark caption for the upload harness.\n"
+           "Second line with an emoji 🚀 and hashtags #benchmark #mock")
+
+
+def _write_test_image(folder):
+    path = os.path.join(folder, "benchmark.png")
+    try:
+        from PIL import Image
+        Image.new('RGB', (400, 400), (200, 120, 60)).save(path, 'PNG')
+    except ImportError:
+        # 1x1 PNG so the benchmark runs without Pillow
+        with open(path, 'wb') as f:
+            f.write(bytes.fromhex(
+                "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de"
+                "0000000c4944415408d763f8cfc0000003010100c9fe92ef0000000049454e44ae426082"))
+    return path
+
+
+# RUNNERS
+# Each returns (start, post, close, waiter): start() logs in, post(image)
+# uploads one post and returns True on success, and waiter holds step timings.
+# headless/performance are honoured where the uploader supports them.
+
+def _main_uploader(url, sessions, headless=False, performance=False):
+    from main import InstagramUploader
+    uploader = InstagramUploader(start_async=False, session_store=sessions, base_url=url,
+                                 headless=headless, performance=performance)
+
+    def start():
+        return uploader.login(USERNAME, PASSWORD)
+
+    def post(image):
+        ok, _ = uploader.upload_post(image, CAPTION)
+        return ok
+    return start, post, uploader.close, uploader.waiter
+
+
+def _automator(url, sessions, headless=False, performance=False):
+    from Automator import InstagramAutomator
+    automator = InstagramAutomator(headless=headless, session_store=sessions, base_url=url)
+
+    def start():
+        return automator.login(USERNAME, PASSWORD) is not None
+
+    def post(image):
+        return automator.create_post(image, CAPTION) is not None
+    return start, post, automator.close, automator.waiter
+
+
+def _enhanced(url, sessions, headless=False, performance=False):
+    from enhanced_instagram_automation import EnhancedInstagramAutomator
+    automator = EnhancedInstagramAutomator(session_store=sessions, base_url=url)
+
+    def start():
+        return automator.login(USERNAME, PASSWORD)
+
+    def post(image):
+        return automator.create_post(image, CAPTION)
+    return start, post, automator.close, automator.waiter
+
+
+def _basic(url, sessions, headless=False, performance=False):
+    from instagram_automation import InstagramAutomator
+    automator = InstagramAutomator(session_store=sessions, base_url=url)
+
+    def start():
+        automator.login(USERNAME, PASSWORD)
+        return True
+
+    def post(image):
+        # automate_post() blocks on input(), so drive the individual steps
+        automator.driver.get(url)
+        automator.create_new_post()
+        automator.upload_image(image)
+        automator.navigate_next_steps()
+        automator.add_caption(CAPTION)
+        automator.share_post()
+        return True
+    return start, post, automator.close, automator.waiter
+
+
+RUNNERS = {
+    'main': _main_uploader,
+    'automator': _automator,
+    'enhanced': _enhanced,
+    'basic': _basic,
+}
+
+
+def run_benchmark(name, url, image, posts, sessions, headless=False, performance=False):
+    """Log in once, upload posts, and return a result dict for one uploader."""
+    start, post, close, waiter = RUNNERS[name](url, sessions, headless, performance)
+    result = {'uploader': name, 'posts': posts, 'succeeded': 0, 'post_seconds': [], 'steps': {}}
+    try:
+        t0 = time.perf_counter()
+        if not start():
+            result['error'] = "login failed"
+            return result
+        result['login_seconds'] = time.perf_counter() - t0
+        for _ in range(posts):
+            waiter.reset()
+            t0 = time.perf_counter()
+            try:
+                ok = post(image)
+            except Exception as e:
+                ok = False
+                result['error'] = str(e)
+            result['post_seconds'].append(time.perf_counter() - t0)
+            result['succeeded'] += int(bool(ok))
+            for step, elapsed, _ in waiter.timings:
+                result['steps'].setdefault(step, []).append(elapsed)
+    finally:
+        close()
+    total = sum(result['post_seconds'])
+    result['posts_per_minute'] = 60 * result['succeeded'] / total if total else 0.0
+    return result
+
+
+def print_report(results):
+    for result in results:
+        print(f"\n== {result['uploader']} ==")
+        if 'login_seconds' in result:
+            print(f"login: {result['login_seconds']:.2f}s")
+        if result.get('error'):
+            print(f"error: {result['error']}")
+        times = result['post_seconds']
+        if times:
+            print(f"posts: {result['succeeded']}/{result['posts']} ok, "
+                  f"mean {statistics.mean(times):.2f}s, max {max(times):.2f}s, "
+                  f"{result['posts_per_minute']:.1f} posts/min")
+        for step, values in result['steps'].items():
+            print(f"  {step:<22} mean {statistics.mean(values):6.2f}s  max {max(values):6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the uploaders against a local mock Instagram")
+    parser.add_argument('--posts', type=int, default=3, help="Posts per uploader")
+    parser.add_argument('--uploaders', default=','.join(RUNNERS), help="Comma-separated subset of: " + ', '.join(RUNNERS))
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--json', help="Also write results to this file")
+    parser.add_argument('--headless', action='store_true', help="Run Chrome headless where supported")
+    parser.add_argument('--performance', action='store_true', help="Use the trimmed Chrome profile (main uploader)")
+    for key, value in DEFAULT_LATENCIES.items():
+        parser.add_argument(f'--{key}-latency', type=float, default=value, dest=key)
+    args = parser.parse_args()
+
+    latencies = {key: getattr(args, key) for key in DEFAULT_LATENCIES}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockInstagramServer(latencies=latencies, fail_rate=args.fail_rate) as server:
+        image = _write_test_image(tmp)
+        sessions = SessionStore(os.path.join(tmp, "sessions"))
+        print(f"Mock Instagram at {server.url}")
+        for name in [n.strip() for n in args.uploaders.split(',') if n.strip()]:
+            results.append(run_benchmark(name, server.url, image, args.posts, sessions,
+                                         args.headless, args.performance))
+        print_report(results)
+        print(f"\nserver: {server.stats()['shared']} shared, {server.stats()['failed']} failed")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
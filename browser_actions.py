@@ -0,0 +1,222 @@
+import itertools
+import re
+
+from waits import StepWaiter
+
+# Elements Instagram renders as buttons: real <button>s and role=button divs
+BUTTON_SELECTOR = "[role='button'], button"
+
+_click_tokens = itertools.count(1)
+
+# Finds the first visible, enabled button whose label matches and clicks it,
+# all inside the browser so the lookup costs one WebDriver round trip.
+# The clicked node is tagged with a token so callers can tell when it goes away.
+_CLICK_BUTTON_JS = """
+const labels = arguments[0];
+const selector = arguments[1];
+const token = arguments[2];
+for (const el of document.querySelectorAll(selector)) {
+    const text = (el.innerText || el.textContent || '').trim().toLowerCase();
+    if (!labels.includes(text)) continue;
+    const rect = el.getBoundingClientRect();
+    if (rect.width === 0 && rect.height === 0) continue;
+    if (el.disabled || el.getAttribute('aria-disabled') === 'true') continue;
+    el.setAttribute('data-automation-clicked', token);
+    el.scrollIntoView({block: 'center'});
+    el.click();
+    return token;
+}
+return null;
+"""
+
+_CLICKED_GONE_JS = """
+const el = document.querySelector('[data-automation-clicked="' + arguments[0] + '"]');
+if (!el || !el.isConnected) return true;
+const rect = el.getBoundingClientRect();
+return rect.width === 0 && rect.height === 0;
+"""
+
+
+# Replaces the editor's content with the whole caption in one step. Rich
+# editors such as Lexical ignore direct DOM edits but handle insertText and
+# paste events like real typing, so their internal state stays in sync.
+_INSERT_TEXT_JS = """
+const el = arguments[0];
+const text = arguments[1];
+el.focus();
+if (el.isContentEditable) {
+    const range = document.createRange();
+    range.selectNodeContents(el);
+    const selection = window.getSelection();
+    selection.removeAllRanges();
+    selection.addRange(range);
+} else if (el.select) {
+    el.select();
+}
+let inserted = false;
+try {
+    inserted = document.execCommand('insertText', false, text);
+} catch (e) {}
+if (!inserted) {
+    const data = new DataTransfer();
+    data.setData('text/plain', text);
+    el.dispatchEvent(new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true}));
+}
+"""
+
+_READ_TEXT_JS = """
+const el = arguments[0];
+return el.isContentEditable ? el.innerText : el.value;
+"""
+
+_CLEAR_TEXT_JS = """
+const el = arguments[0];
+el.focus();
+if (el.isContentEditable) {
+    const range = document.createRange();
+    range.selectNodeContents(el);
+    window.getSelection().removeAllRanges();
+    window.getSelection().addRange(range);
+} else if (el.select) {
+    el.select();
+}
+document.execCommand('delete');
+"""
+
+
+def _text_length(text):
+    # Editors render line breaks as paragraphs, so whitespace is not compared
+    return len(re.sub(r'\s+', '', text or ''))
+
+
+def _text_reaches(driver, element, length, timeout):
+    """True once the field's text has the given length; rich editors apply edits asynchronously."""
+    waiter = StepWaiter(driver, timeout=timeout, poll_interval=0.1)
+    return bool(waiter.until("editor_text", lambda d: _text_length(d.execute_script(_READ_TEXT_JS, element)) == length,
+                             raise_on_timeout=False))
+
+
+def insert_text(driver, element, text, settle=2.0):
+    """
+    Put text into an input or rich-text editor in one call, typing only as a fallback.
+
+    The text is inserted with a single insertText (or paste) event, then the
+    editor's text length is polled for up to settle seconds. If it never
+    matches, the field is cleared and, once it is verifiably empty, the text
+    is typed with send_keys, minus characters outside the Basic Multilingual
+    Plane that ChromeDriver cannot type.
+
+    Returns:
+        str: 'script' or 'send_keys', whichever method produced the text
+
+    Raises:
+        RuntimeError: The field could not be cleared after a failed insert
+    """
+    try:
+        driver.execute_script(_INSERT_TEXT_JS, element, text)
+    except Exception:
+        pass  # Part of the text may still have landed; the checks below decide
+    if _text_reaches(driver, element, _text_length(text), settle):
+        return 'script'
+    try:
+        driver.execute_script(_CLEAR_TEXT_JS, element)
+    except Exception:
+        pass
+    # Typing into a field that still holds part of the caption would post it twice
+    if not _text_reaches(driver, element, 0, settle):
+        raise RuntimeError("text field could not be cleared after a failed insert")
+    element.send_keys(''.join(ch for ch in text if ord(ch) <= 0xFFFF))
+    return 'send_keys'
+
+
+def click_button(driver, *labels, selector=BUTTON_SELECTOR):
+    """
+    Click the first visible button whose text matches one of labels.
+
+    Args:
+        driver: Selenium WebDriver
+        *labels (str): Button labels, compared case-insensitively
+        selector (str): CSS selector for candidate elements
+
+    Returns:
+        str: Token of the clicked element, or None when nothing matched
+    """
+    wanted = [label.strip().lower() for label in labels]
+    token = f"click-{next(_click_tokens)}"
+    return driver.execute_script(_CLICK_BUTTON_JS, wanted, selector, token)
+
+
+# CONDITIONS
+# For use with waits.StepWaiter.until
+
+def button_clicked(*labels, selector=BUTTON_SELECTOR):
+    """Clicks a matching button as soon as one exists; returns its token."""
+    def _condition(driver):
+        return click_button(driver, *labels, selector=selector)
+    return _condition
+
+
+def click_released(token):
+    """True once the element clicked with token has left the page or been hidden."""
+    def _condition(driver):
+        return driver.execute_script(_CLICKED_GONE_JS, token)
+    return _condition
+
+
+# SHARE COMPLETION
+# A MutationObserver installed before Share is clicked records the first
+# success or failure message Instagram renders, so the result is known the
+# moment it appears instead of after a fixed sleep.
+
+SHARED_TEXTS = ["your post has been shared", "post shared", "your reel has been shared"]
+FAILED_TEXTS = ["couldn't be shared", "could not be shared", "something went wrong", "upload failed"]
+
+_WATCH_SHARE_JS = """
+const shared = arguments[0];
+const failed = arguments[1];
+if (window.__shareObserver) window.__shareObserver.disconnect();
+window.__shareResult = null;
+const check = (text) => {
+    if (window.__shareResult || !text) return;
+    text = text.toLowerCase();
+    // Failure messages also contain "shared", so test them first
+    const bad = failed.find(t => text.includes(t));
+    const good = bad ? null : shared.find(t => text.includes(t));
+    if (!bad && !good) return;
+    window.__shareResult = {state: bad ? 'failed' : 'shared', text: bad || good};
+    window.__shareObserver.disconnect();
+    if (window.__shareResolve) window.__shareResolve(window.__shareResult);
+};
+window.__shareObserver = new MutationObserver((records) => {
+    for (const record of records) {
+        if (record.type === 'characterData') check(record.target.textContent);
+        for (const node of record.addedNodes) check(node.textContent);
+    }
+});
+window.__shareObserver.observe(document.body, {childList: true, subtree: true, characterData: true});
+"""
+
+_AWAIT_SHARE_JS = """
+const timeoutMs = arguments[0];
+const done = arguments[arguments.length - 1];
+if (window.__shareResult) { done(window.__shareResult); return; }
+const timer = setTimeout(() => done({state: 'timeout', text: ''}), timeoutMs);
+window.__shareResolve = (result) => { clearTimeout(timer); done(result); };
+"""
+
+
+def watch_share_result(driver):
+    """Start watching for Instagram's share success/failure message. Call before clicking Share."""
+    driver.execute_script(_WATCH_SHARE_JS, SHARED_TEXTS, FAILED_TEXTS)
+
+
+def wait_for_share_result(driver, timeout=60):
+    """
+    Block until the watched page reports the share outcome.
+
+    Returns:
+        tuple: (state, text) where state is 'shared', 'failed' or 'timeout'
+    """
+    driver.set_script_timeout(timeout + 5)
+    result = driver.execute_async_script(_AWAIT_SHARE_JS, int(timeout * 1000)) or {}
+    return result.get('state', 'timeout'), result.get('text', '')
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace differences that do not change the prompt's meaning."""
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in str(prompt).splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def cache_key(model_name, prompt, params=None):
+    """Content address for a response: model, normalized prompt and generation parameters."""
+    payload = json.dumps({'model': model_name, 'prompt': normalize_prompt(prompt), 'params': params or {}},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CaptionCache:
+    """
+    SQLite-backed cache of generated captions with TTL and LRU eviction.
+
+    Safe to share between threads. Only successful, non-empty responses are stored.
+    """
+
+    def __init__(self, path=os.path.join('cache', 'captions.sqlite3'), ttl=30 * 24 * 3600, max_entries=20000):
+        """
+        Args:
+            path (str): SQLite database file
+            ttl (float): Seconds an entry stays valid (None for no expiry)
+            max_entries (int): Least recently used entries beyond this are evicted
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT,"
+                " created REAL, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS captions_last_used ON captions(last_used)")
+
+    def get(self, key):
+        """Cached response for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT response, created FROM captions WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM captions WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE captions SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response, model=None):
+        if not response:
+            return
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO captions (key, model, response, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM captions WHERE key IN (SELECT key FROM captions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def stats(self):
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'entries': size}
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM captions")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,61 @@
+import json
+import os
+import threading
+import time
+
+
+class CaptionLedger:
+    """
+    Per-sheet record of the caption generated for each row, keyed by row fingerprint.
+
+    Saved as JSON next to the spreadsheet (<sheet>.captions.json), so a later
+    Generate All only calls Gemini for rows whose prompt inputs changed or
+    whose last attempt failed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        self.load()
+
+    @classmethod
+    def for_sheet(cls, sheet_path):
+        return cls(os.path.splitext(sheet_path)[0] + '.captions.json')
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get('rows', {})
+        except (OSError, ValueError):
+            entries = {}
+        with self._lock:
+            self._entries = entries
+            self._dirty = False
+
+    def get(self, fingerprint):
+        with self._lock:
+            return self._entries.get(fingerprint)
+
+    def is_current(self, fingerprint, model=None):
+        """True if a successful caption for this fingerprint (and model, when given) is recorded."""
+        entry = self.get(fingerprint)
+        return bool(entry and entry.get('ok') and (model is None or entry.get('model') == model))
+
+    def record(self, fingerprint, caption, ok=True, model=None):
+        with self._lock:
+            self._entries[fingerprint] = {'caption': caption, 'ok': ok, 'model': model, 'updated': time.time()}
+            self._dirty = True
+
+    def save(self):
+        """Write the ledger if anything changed since the last load or save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            record = {'saved_at': time.time(), 'rows': dict(self._entries)}
+            self._dirty = False
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
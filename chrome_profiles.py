@@ -0,0 +1,49 @@
+try:
+    from selenium.webdriver.chrome.options import Options
+except ImportError:
+    Options = None
+
+# Requests the upload flow never needs. Instagram's own scripts and the
+# uploaded image itself are left alone.
+BLOCKED_URL_PATTERNS = [
+    # Video and audio from the feed and stories
+    "*.mp4*", "*.webm*", "*.m3u8*", "*.m4a*",
+    # Web fonts
+    "*.woff*", "*.ttf*", "*.otf*",
+    # Third-party analytics and ad scripts
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*connect.facebook.net*",
+]
+
+
+def build_chrome_options(headless=False, performance=False, window_size=(1280, 900), maximize=True):
+    """
+    Chrome options for the uploaders.
+
+    Args:
+        headless (bool): Use new-style headless mode with a fixed viewport
+        performance (bool): Trim background features and use the 'eager' page-load strategy
+        window_size (tuple): Viewport used in headless mode
+        maximize (bool): Maximize the window when not headless
+    """
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
+        options.add_argument("--disable-gpu")
+    elif maximize:
+        options.add_argument("--start-maximized")
+    if performance:
+        # Return from driver.get() at DOMContentLoaded; the step waits cover the rest
+        options.page_load_strategy = 'eager'
+        for arg in ("--disable-extensions", "--disable-background-networking", "--disable-default-apps",
+                    "--disable-sync", "--disable-notifications", "--mute-audio", "--no-first-run",
+                    "--disable-dev-shm-usage"):
+            options.add_argument(arg)
+    return options
+
+
+def apply_network_blocking(driver, patterns=None):
+    """Block URL patterns (default BLOCKED_URL_PATTERNS) through the Chrome DevTools Protocol."""
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns or BLOCKED_URL_PATTERNS)})
@@ -0,0 +1,111 @@
+import threading
+
+
+class UploaderPool:
+    """
+    Bounded pool of uploaders (one Chrome each) with account affinity.
+
+    acquire() hands out an idle uploader, preferring one already logged into
+    the requested account so its session is reused. Each uploader is used by
+    one batch at a time, so an account's posts stay sequential while
+    different accounts upload side by side. The primary keeps the account it
+    is logged into; it is only switched when it is the pool's only browser.
+    """
+
+    def __init__(self, factory, size=2, primary=None):
+        """
+        Args:
+            factory (callable): Creates a new uploader (must expose .account, .driver, .stop, .reset_stop, .close)
+            size (int): Maximum number of uploaders, including primary
+            primary: Existing uploader to reuse as the first pool member
+        """
+        self.factory = factory
+        self.size = size
+        self.primary = primary
+        self._uploaders = [primary] if primary is not None else []
+        self._busy = set()
+        self._creating = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, account=None, timeout=None):
+        """
+        Borrow an uploader for account, blocking until one is free.
+
+        Returns:
+            The uploader, or None if timeout expired
+        """
+        while True:
+            with self._cond:
+                uploader, create = self._pick(account, timeout)
+                if not create:
+                    return uploader
+            # Start Chrome outside the lock so other batches are not held up
+            try:
+                uploader = self.factory()
+            except Exception:
+                uploader = None
+            with self._cond:
+                self._creating -= 1
+                if uploader is not None and uploader.driver is not None:
+                    self._uploaders.append(uploader)
+                    self._busy.add(id(uploader))
+                    return uploader
+                # Could not start another browser; share the ones already running
+                self.size = len(self._uploaders)
+                self._cond.notify_all()
+            if uploader is not None:
+                uploader.close()
+            if not self.size:
+                raise RuntimeError("Could not start a browser for the upload pool")
+
+    def _pick(self, account, timeout):
+        # Called with the lock held. Returns (uploader, create); create=True means
+        # a slot was reserved and the caller should start a new uploader
+        while True:
+            idle = [u for u in self._uploaders if id(u) not in self._busy and u.driver is not None]
+            match = next((u for u in idle if u.account == account), None)
+            if match is None and account is None and self.primary in idle:
+                match = self.primary
+            if match is None and len(self._uploaders) + self._creating < self.size:
+                self._creating += 1
+                return None, True
+            if match is None and idle:
+                # Prefer a browser nobody is logged into, then any idle one other than the primary
+                others = [u for u in idle if u is not self.primary]
+                if others:
+                    match = next((u for u in others if u.account is None), others[0])
+                elif len(self._uploaders) == 1:
+                    match = self.primary
+            if match is not None:
+                self._busy.add(id(match))
+                return match, False
+            if not self._cond.wait(timeout):
+                return None, False
+
+    def release(self, uploader):
+        with self._cond:
+            self._busy.discard(id(uploader))
+            self._cond.notify_all()
+
+    def uploaders(self):
+        with self._cond:
+            return list(self._uploaders)
+
+    def stop(self):
+        for uploader in self.uploaders():
+            uploader.stop()
+
+    def reset_stop(self):
+        for uploader in self.uploaders():
+            uploader.reset_stop()
+
+    def close(self):
+        """Close every uploader the pool started (the primary is left to its owner)."""
+        with self._cond:
+            extra = [u for u in self._uploaders if u is not self.primary]
+            self._uploaders = [u for u in self._uploaders if u is self.primary]
+        for uploader in extra:
+            try:
+                uploader.close()
+            except Exception:
+                pass
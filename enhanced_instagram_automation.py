@@ -1,13 +1,23 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-import time
 import os
 
+from waits import (StepWaiter, NEW_POST_BUTTON, FILE_INPUT, CAPTION_EDITOR, element_present,
+                   element_clickable, any_of)
+from browser_actions import button_clicked, click_released, insert_text, watch_share_result, wait_for_share_result
+from session_store import SessionStore, INSTAGRAM_URL, session_active, login_succeeded
+
 class EnhancedInstagramAutomator:
-    def __init__(self, wait=5):
+    def __init__(self, wait=5, timeout=20, poll_interval=0.25, session_store=None, base_url=INSTAGRAM_URL,
+                 share_timeout=60):
+        # wait is kept for compatibility; every step now waits on a page signal instead
         self.wait = wait
+        self.share_timeout = share_timeout
         self.driver = None
         self.logged_in = False
+        self.waiter = StepWaiter(timeout=timeout, poll_interval=poll_interval)
+        self.sessions = session_store or SessionStore()
+        self.base_url = base_url
         self.setup_driver()
     
     def setup_driver(self):
@@ -16,25 +26,36 @@ class EnhancedInstagramAutomator:
         chrome_options.add_argument("--start-maximized")
         chrome_options.add_argument("--disable-notifications")
         self.driver = webdriver.Chrome(options=chrome_options)
+        self.waiter.driver = self.driver
     
     def login(self, username, password):
         """Login to Instagram"""
         if self.logged_in:
             return True
+        
+        if self.sessions.restore(self.driver, username, self.base_url):
+            if session_active(self.waiter):
+                self.sessions.save(self.driver, username)
+                self.logged_in = True
+                print("Restored saved session!")
+                return True
+            print("Saved session expired, logging in again...")
+            self.sessions.clear(username)
             
         print("Navigating to Instagram...")
-        self.driver.get("https://www.instagram.com/")
-        time.sleep(self.wait)
+        self.driver.get(self.base_url)
         
         print("Entering credentials...")
-        self.driver.find_element("name", "username").send_keys(username)
+        self.waiter.until("username_field", element_clickable("//input[@name='username']")).send_keys(username)
         self.driver.find_element("name", "password").send_keys(password)
-        time.sleep(self.wait)
         
         print("Clicking login button...")
-        button = self.driver.find_element("xpath", "//button[@type='submit']")
+        button = self.waiter.until("login_button", element_clickable("//button[@type='submit']"))
         button.click()
-        time.sleep(self.wait)
+        if not login_succeeded(self.waiter):
+            print("Login failed - no session after submit (wrong credentials or checkpoint?)")
+            return False
+        self.sessions.save(self.driver, username)
         
         self.logged_in = True
         print("Login successful!")
@@ -46,49 +67,42 @@ class EnhancedInstagramAutomator:
             raise FileNotFoundError(f"Image file not found: {image_path}")
         self.driver.refresh()
         print("Creating new post...")
-        time.sleep(self.wait)
+        self.waiter.reset()
         
         # Click new post button
-        self.driver.find_element("xpath", "//*[@aria-label='New post']").click()
-        time.sleep(self.wait)
+        self.waiter.until("new_post", element_clickable(NEW_POST_BUTTON)).click()
         
         # Upload image
         print(f"Uploading image: {image_path}")
-        self.driver.find_element("xpath", "//input[@type='file']").send_keys(os.path.abspath(image_path))
-        time.sleep(self.wait)
+        self.waiter.until("file_input", element_present(FILE_INPUT)).send_keys(os.path.abspath(image_path))
         
-        # Navigate through the post creation steps
+        # Navigate through the post creation steps until the caption editor appears
         print("Navigating through post creation...")
-        buttons = self.driver.find_elements("xpath", "//*[@role='button']")
         for step in range(5):  # Multiple steps in post creation
-            for btn in buttons:
-                try:
-                    if btn.text.strip().lower() == "next":
-                        btn.click()
-                        break
-                except:
-                    continue
-            time.sleep(self.wait)
-            # Refresh button list for next iteration
-            buttons = self.driver.find_elements("xpath", "//*[@role='button']")
+            # Returns the caption editor, or the token of the Next button it clicked
+            ready = self.waiter.until(f"next_{step + 1}", any_of(
+                element_present(CAPTION_EDITOR), button_clicked("next")
+            ))
+            if not isinstance(ready, str):
+                break
+            self.waiter.until(f"next_{step + 1}_advance", click_released(ready), timeout=2, raise_on_timeout=False)
         
         # Add caption
         print("Adding caption...")
-        self.driver.find_element("xpath", "//*[@data-lexical-editor='true']").send_keys(str(caption))
-        time.sleep(self.wait)
+        editor = self.waiter.until("caption_editor", element_present(CAPTION_EDITOR))
+        insert_text(self.driver, editor, str(caption))
         
         # Share the post
         print("Sharing post...")
-        buttons = self.driver.find_elements("xpath", "//*[@role='button']")
-        for btn in buttons:
-            try:
-                if btn.text.strip().lower() == "share":
-                    btn.click()
-                    break
-            except:
-                pass
+        watch_share_result(self.driver)
+        self.waiter.until("share", button_clicked("share"))
         
-        time.sleep(self.wait)
+        state, text = wait_for_share_result(self.driver, self.share_timeout)
+        print(f"Step waits: {self.waiter.summary()}")
+        if state == 'failed':
+            raise RuntimeError(f"Instagram reported: {text}")
+        if state != 'shared':
+            raise RuntimeError(f"Post not confirmed within {self.share_timeout} seconds")
         print("Post shared successfully!")
         return True
     
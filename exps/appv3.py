@@ -44,6 +44,7 @@ class SocialMediaGenerator:
         self.data = None
         self.cards = []
         self.gemini_api_key = ""
+        self.caption_model = None  # Created once in set_api_key and shared by all cards
         self.generated_data = []  # Store all generated content for export
         
         self.setup_ui()
@@ -125,6 +126,7 @@ class SocialMediaGenerator:
         if self.gemini_api_key:
             try:
                 genai.configure(api_key=self.gemini_api_key)
+                self.caption_model = genai.GenerativeModel('gemini-2.0-flash-exp')
                 messagebox.showinfo("Success", "API Key set successfully!")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to configure API: {str(e)}")
@@ -532,8 +534,8 @@ Prompt: {data.get('prompt', 'N/A')[:200]}{'...' if len(str(data.get('prompt', ''
         index = card.index
         
         try:
-            # Initialize Gemini models
-            caption_model = genai.GenerativeModel('gemini-2.0-flash-exp')
+            # Reuse the model created when the API key was set
+            caption_model = self.caption_model or genai.GenerativeModel('gemini-2.0-flash-exp')
             
             # Extract image URL from prompt for reference
             prompt = str(data.get('prompt', ''))
@@ -0,0 +1,347 @@
+import asyncio
+import hashlib
+import json
+import re
+
+from caption_cache import cache_key, normalize_prompt
+from rate_limiter import is_rate_limit_error, retry_after_hint, estimate_tokens
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+DEFAULT_MODEL = 'gemini-2.0-flash-exp'
+
+# Spreadsheet columns that feed the caption prompt
+PROMPT_COLUMNS = ('brand_name', 'platform_type', 'content', 'prompt', 'phone_number', 'email_id')
+
+
+class CaptionPrompt(str):
+    """
+    Caption prompt text plus what the similar-prompt cache compares: prompts
+    with the same `scope` (brand and platform), by the similarity of their `topic`.
+    """
+
+    def __new__(cls, text, scope='', topic=None):
+        prompt = super().__new__(cls, text)
+        prompt.scope = scope
+        prompt.topic = text if topic is None else topic
+        return prompt
+
+
+def build_caption_prompt(data):
+    """Caption prompt for one spreadsheet row (a pandas Series or dict)."""
+    theme, context = data.get('content', ''), data.get('prompt', '')
+    text = f"""You are a social media copywriter. Create ONE engaging caption.\nBrand: {data.get('brand_name','')}\nPlatform: {data.get('platform_type','Instagram')}\nTheme: {theme}\nContext: {context}\nPhone: {data.get('phone_number','')} Email: {data.get('email_id','')}\nRules: Hook first line, <=150 words, 5-8 relevant hashtags end, CTA, premium tone.\nReturn only caption."""
+    # Rows are only reused for the same brand and platform, by how close their theme and context are
+    return CaptionPrompt(text, scope=f"{data.get('brand_name','')}\n{data.get('platform_type','Instagram')}",
+                         topic=f"{theme}\n{context}")
+
+
+def row_fingerprint(data):
+    """Stable hash of the prompt columns of one row; changes exactly when the prompt inputs do."""
+    values = {column: str(data.get(column, '')).strip() for column in PROMPT_COLUMNS}
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+# Response schema for batched requests: one caption per requested row id
+CAPTION_BATCH_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'row_id': {'type': 'string'},
+            'caption': {'type': 'string'},
+        },
+        'required': ['row_id', 'caption'],
+    },
+}
+
+
+def build_batch_prompt(rows):
+    """One prompt covering several rows; rows is a list of (row_id, data)."""
+    items = [{
+        'row_id': row_id,
+        'brand': str(data.get('brand_name', '')),
+        'platform': str(data.get('platform_type', 'Instagram')),
+        'theme': str(data.get('content', '')),
+        'context': str(data.get('prompt', '')),
+        'phone': str(data.get('phone_number', '')),
+        'email': str(data.get('email_id', '')),
+    } for row_id, data in rows]
+    return (
+        "You are a social media copywriter. For EACH row below create ONE engaging caption.\n"
+        "Rules: Hook first line, <=150 words, 5-8 relevant hashtags end, CTA, premium tone.\n"
+        "Return a JSON array with one object per row: {\"row_id\": <row_id>, \"caption\": <caption>}.\n"
+        "Rows:\n" + json.dumps(items, ensure_ascii=False, indent=1)
+    )
+
+
+def parse_batch_response(text, row_ids):
+    """{row_id: caption} for every well-formed entry whose row_id was requested."""
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', (text or '').strip())
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+    wanted = set(row_ids)
+    captions = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        row_id = str(item.get('row_id', ''))
+        caption = item.get('caption')
+        if row_id in wanted and row_id not in captions and isinstance(caption, str) and caption.strip():
+            captions[row_id] = caption.strip()
+    return captions
+
+
+class GeminiClient:
+    """
+    Long-lived Gemini model shared by every generation thread.
+
+    Created once when the API key is set, so model setup and the HTTP/TLS
+    connection are reused across the whole batch instead of per row.
+    """
+
+    def __init__(self, api_key=None, model_name=DEFAULT_MODEL, generation_config=None, cache=None,
+                 rate_limiter=None, max_rate_limit_retries=5, semantic_cache=None):
+        """
+        Args:
+            api_key (str): Configures the SDK when given
+            model_name (str): Gemini model to call
+            generation_config (dict): e.g. {'temperature': 0.9, 'max_output_tokens': 512}
+            cache (CaptionCache): Optional response cache consulted before each call
+            rate_limiter (AdaptiveRateLimiter): Optional shared pacing for API calls
+            max_rate_limit_retries (int): Times a request is retried after a quota error
+            semantic_cache (SemanticCache): Optional near-duplicate lookup after an exact cache miss
+        """
+        if genai is None:
+            raise RuntimeError("Gemini SDK missing")
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.generation_config = dict(generation_config or {})
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.rate_limiter = rate_limiter
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.model = genai.GenerativeModel(model_name, generation_config=self.generation_config or None)
+        # The SDK creates its transport lazily on the first call; let one caller do that
+        self._first_call_async_lock = None
+        self._warm_async = False
+
+    async def generate_async(self, prompt, force_refresh=False, on_chunk=None, priority=0, timeout=None):
+        """
+        Return the stripped response text for prompt, from the cache unless force_refresh.
+
+        With on_chunk the response is streamed and on_chunk(text_so_far) is called
+        as each chunk arrives (once with the whole text on a cache hit).
+        priority orders rate-limiter waits; timeout (seconds) bounds each API
+        call, not the time spent waiting for rate-limit budget.
+        """
+        key, cached = await self._cached(prompt, force_refresh, on_chunk)
+        if cached is not None:
+            return cached
+        text = await self._generate_async(prompt, on_chunk=on_chunk, priority=priority, timeout=timeout)
+        await self._store(prompt, key, text)
+        return text
+
+    async def generate_batch_async(self, rows, force_refresh=False, max_splits=2, priority=0, timeout=None):
+        """
+        Generate captions for several rows with as few requests as possible.
+
+        Rows already in the cache are answered from it, and rows with the same
+        prompt are sent once. The rest go out in one request that asks for a
+        JSON array keyed by row id. Rows missing from,
+        or malformed in, the response are split into smaller batches and
+        retried; after max_splits a row falls back to its own request.
+
+        Args:
+            rows (list): (row_id, data) pairs; row_id must be unique strings
+            force_refresh (bool): Ignore cached captions
+
+        Returns:
+            dict: {row_id: caption or Exception}
+        """
+        results, pending = await self._cached_rows(rows, force_refresh)
+        pending, duplicates = self._unique_rows(pending)
+        if pending:
+            results.update(await self._generate_rows_async(pending, max_splits, priority, timeout))
+        return self._copy_duplicates(results, duplicates)
+
+    async def _cached(self, prompt, force_refresh, on_chunk=None):
+        """(cache key, cached text or None) for prompt; exact match first, then a near-duplicate."""
+        key = cache_key(self.model_name, prompt, self.generation_config) if self.cache is not None else None
+        cached = None
+        if not force_refresh:
+            if key is not None:
+                cached = self.cache.get(key)
+            if cached is None and self.semantic_cache is not None:
+                # A similarity lookup scans the whole index; keep it off the event loop
+                cached = await self._offload(self.semantic_cache.get, *self._similarity_key(prompt))
+        if cached is not None and on_chunk is not None:
+            on_chunk(cached)
+        return key, cached
+
+    async def _store(self, prompt, key, text):
+        if key is not None:
+            self.cache.put(key, text, self.model_name)
+        if self.semantic_cache is not None:
+            topic, scope = self._similarity_key(prompt)
+            await self._offload(self.semantic_cache.put, topic, text, scope)
+
+    @staticmethod
+    def _offload(func, *args):
+        """Run a blocking call on the loop's default executor."""
+        return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    @staticmethod
+    def _similarity_key(prompt):
+        """(text to embed, scope) for the similar-prompt cache; a plain string is its own topic."""
+        return getattr(prompt, 'topic', prompt), getattr(prompt, 'scope', '')
+
+    async def _cached_rows(self, rows, force_refresh):
+        results = {}
+        pending = []
+        for row_id, data in rows:
+            _, cached = await self._cached(build_caption_prompt(data), force_refresh)
+            if cached is not None:
+                results[row_id] = cached
+            else:
+                pending.append((row_id, data))
+        return results, pending
+
+    @staticmethod
+    def _unique_rows(rows):
+        """Rows with distinct prompts, plus {duplicate row_id: row_id of the same prompt that is sent}."""
+        first = {}
+        unique = []
+        duplicates = {}
+        for row_id, data in rows:
+            prompt = normalize_prompt(build_caption_prompt(data))
+            if prompt in first:
+                duplicates[row_id] = first[prompt]
+            else:
+                first[prompt] = row_id
+                unique.append((row_id, data))
+        return unique, duplicates
+
+    @staticmethod
+    def _copy_duplicates(results, duplicates):
+        for row_id, source in duplicates.items():
+            results[row_id] = results.get(source, RuntimeError("no caption returned"))
+        return results
+
+    def _batch_request(self, rows):
+        """(prompt, generation config, output token budget) for one batched request."""
+        config = {**self.generation_config, 'response_mime_type': 'application/json',
+                  'response_schema': CAPTION_BATCH_SCHEMA}
+        output_tokens = self.generation_config.get('max_output_tokens', 512) * len(rows)
+        return build_batch_prompt(rows), config, output_tokens
+
+    async def _batch_results(self, rows, text):
+        """Parse a batched reply, cache each caption under its single-row key and split off the missing rows."""
+        results = parse_batch_response(text, [row_id for row_id, _ in rows])
+        for row_id, data in rows:
+            if row_id in results:
+                prompt = build_caption_prompt(data)
+                key = cache_key(self.model_name, prompt, self.generation_config) if self.cache is not None else None
+                await self._store(prompt, key, results[row_id])
+        missing = [row for row in rows if row[0] not in results]
+        mid = (len(missing) + 1) // 2
+        return results, [part for part in (missing[:mid], missing[mid:]) if part]
+
+    async def _generate_rows_async(self, rows, splits_left, priority=0, timeout=None):
+        if len(rows) == 1 or splits_left < 0:
+            results = {}
+            for row_id, data in rows:
+                try:
+                    results[row_id] = await self.generate_async(build_caption_prompt(data), force_refresh=True,
+                                                                priority=priority, timeout=timeout)
+                except Exception as e:
+                    results[row_id] = e
+            return results
+        text = await self._generate_async(*self._batch_request(rows), priority=priority, timeout=timeout)
+        results, retry = await self._batch_results(rows, text)
+        for part in retry:
+            results.update(await self._generate_rows_async(part, splits_left - 1, priority, timeout))
+        return results
+
+    async def _generate_async(self, prompt, generation_config=None, output_tokens=None, on_chunk=None, priority=0,
+                              timeout=None):
+        if not self._warm_async:
+            if self._first_call_async_lock is None:
+                self._first_call_async_lock = asyncio.Lock()
+            async with self._first_call_async_lock:
+                if not self._warm_async:
+                    text = await self._call_async(prompt, generation_config, output_tokens, on_chunk, priority, timeout)
+                    self._warm_async = True
+                    return text
+        return await self._call_async(prompt, generation_config, output_tokens, on_chunk, priority, timeout)
+
+    async def _call_async(self, prompt, generation_config=None, output_tokens=None, on_chunk=None, priority=0,
+                          timeout=None):
+        kwargs = self._request_kwargs(generation_config, on_chunk)
+        if self.rate_limiter is None:
+            _, text = await self._request_async(prompt, kwargs, on_chunk, timeout)
+            return text
+        estimate = self._estimate(prompt, output_tokens)
+        attempts = 0
+        while True:
+            await self.rate_limiter.acquire_async(estimate, priority)
+            try:
+                resp, text = await self._request_async(prompt, kwargs, on_chunk, timeout)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempts >= self.max_rate_limit_retries:
+                    raise
+                attempts += 1
+                self.rate_limiter.on_rate_limited(retry_after_hint(e))
+                continue
+            self._record_success(resp, estimate)
+            return text
+
+    async def _request_async(self, prompt, kwargs, on_chunk, timeout):
+        """(response, text) of one API call, raising TimeoutError after timeout seconds."""
+        async def request():
+            resp = await self.model.generate_content_async(prompt, **kwargs)
+            return resp, await self._read_async(resp, on_chunk)
+        try:
+            return await asyncio.wait_for(request(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"no response within {timeout}s") from None
+
+    @staticmethod
+    def _request_kwargs(generation_config, on_chunk):
+        kwargs = {'generation_config': generation_config} if generation_config else {}
+        if on_chunk is not None:
+            kwargs['stream'] = True
+        return kwargs
+
+    def _estimate(self, prompt, output_tokens):
+        if output_tokens is None:
+            output_tokens = self.generation_config.get('max_output_tokens', 512)
+        return estimate_tokens(prompt, output_tokens)
+
+    def _record_success(self, resp, estimate):
+        self.rate_limiter.on_success()
+        usage = getattr(resp, 'usage_metadata', None)
+        self.rate_limiter.record_tokens(estimate, getattr(usage, 'total_token_count', None))
+
+    @staticmethod
+    async def _read_async(resp, on_chunk=None):
+        if not resp:
+            return ''
+        if on_chunk is None:
+            return (resp.text or '').strip()
+        # A streamed response is consumed chunk by chunk; usage_metadata is filled in at the end
+        text = ''
+        async for chunk in resp:
+            piece = getattr(chunk, 'text', '') or ''
+            if piece:
+                text += piece
+                on_chunk(text)
+        return text.strip()
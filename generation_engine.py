@@ -0,0 +1,480 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import as_completed
+
+from gemini_client import GeminiClient, DEFAULT_MODEL, build_caption_prompt, row_fingerprint
+from caption_cache import CaptionCache, cache_key
+from rate_limiter import AdaptiveRateLimiter, is_rate_limit_error
+from metrics import StepMetrics
+from semantic_cache import SemanticCache
+from resilience import RetryPolicy, CircuitBreaker, HedgePolicy, is_transient_error
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+# Request priorities: lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+
+class PrioritySemaphore:
+    """
+    asyncio semaphore that hands free slots to the most urgent waiter (lowest
+    priority number), first come first served within a priority.
+    """
+
+    def __init__(self, value):
+        self.capacity = value
+        self._value = value
+        self._heap = []
+        self._seq = itertools.count()
+        self._waiting = {}
+        self._running = {}
+
+    async def acquire(self, priority):
+        if self._value > 0 and not any(self._waiting.values()):
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), future))
+        self._waiting[priority] = self._waiting.get(priority, 0) + 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self.release()
+            else:
+                self._waiting[priority] -= 1
+            raise
+
+    def release(self):
+        if self._value < 0:
+            # Paying back a shrink from resize()
+            self._value += 1
+            return
+        while self._heap:
+            priority, _, future = heapq.heappop(self._heap)
+            if not future.done():
+                self._waiting[priority] -= 1
+                future.set_result(None)
+                return
+        self._value += 1
+
+    def resize(self, value):
+        diff = value - self.capacity
+        self.capacity = value
+        if diff < 0:
+            self._value += diff
+        for _ in range(diff):
+            self.release()
+
+    def depth(self):
+        """{priority: (waiting for a slot, holding one)}; safe to call from other threads."""
+        waiting, running = dict(self._waiting), dict(self._running)
+        return {priority: (waiting.get(priority, 0), running.get(priority, 0))
+                for priority in sorted(set(waiting) | set(running))
+                if waiting.get(priority) or running.get(priority)}
+
+    def slot(self, priority):
+        return _Slot(self, priority)
+
+
+class _Slot:
+    def __init__(self, semaphore, priority):
+        self.semaphore = semaphore
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.semaphore.acquire(self.priority)
+        running = self.semaphore._running
+        running[self.priority] = running.get(self.priority, 0) + 1
+
+    async def __aexit__(self, *exc):
+        self.semaphore._running[self.priority] -= 1
+        self.semaphore.release()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls onto one in-flight task (use from the event loop only).
+
+    The first caller for a key starts the call; callers arriving while it runs
+    await the same task. A caller being cancelled does not cancel the shared
+    task unless it was the last one waiting.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        entry = self._calls.get(key)
+        if entry is None:
+            entry = {'task': asyncio.ensure_future(func()), 'waiters': 0}
+            self._calls[key] = entry
+            entry['task'].add_done_callback(lambda _, k=key, e=entry: self._calls.pop(k) if self._calls.get(k) is e else None)
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        entry['waiters'] += 1
+        try:
+            return await asyncio.shield(entry['task'])
+        finally:
+            entry['waiters'] -= 1
+            if entry['waiters'] == 0 and not entry['task'].done():
+                # Forget the dying task now, so an identical call arriving before it finishes starts afresh
+                if self._calls.get(key) is entry:
+                    del self._calls[key]
+                entry['task'].cancel()
+
+    def stats(self):
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+
+class GenerationEngine:
+    """
+    Runs Gemini calls on an asyncio event loop in a dedicated thread.
+
+    Callers on any thread submit prompts and get concurrent.futures.Future
+    objects back; at most `concurrency` requests are in flight at once and
+    the rest wait on a semaphore inside the loop, so thousands of rows cost
+    coroutines rather than threads. Cancelling a future cancels its request.
+
+    Every attempt runs under the retry policy's timeout. Transient failures
+    are retried with backoff after giving up their slot, and the circuit
+    breaker fails the rest of a batch fast while the API is down. With a
+    hedge policy, single-caption requests slower than the recent p95 race
+    a duplicate and keep whichever answers first. Identical prompts submitted
+    while one is in flight share its result instead of calling the API again.
+
+    Requests carry a priority: PRIORITY_INTERACTIVE requests take the next
+    free slot (and rate-limiter budget) ahead of queued PRIORITY_BULK work.
+    """
+
+    def __init__(self, client, concurrency=8, metrics=None, retry_policy=None, breaker=None, hedge=None,
+                 coalesce=True):
+        """
+        Args:
+            client (GeminiClient): Shared client whose async API is used
+            concurrency (int): Maximum requests in flight
+            metrics (StepMetrics): Optional; records caption_queue, caption_first_token, caption_total,
+                caption_batch and caption_backoff
+            retry_policy (RetryPolicy): Timeout and retries per request (default RetryPolicy())
+            breaker (CircuitBreaker): Optional breaker shared by all requests
+            hedge (HedgePolicy): Optional hedging for single-caption requests
+            coalesce (bool): Share one call between identical in-flight prompts (streamed requests excluded)
+        """
+        self.client = client
+        self.metrics = metrics
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker
+        self.hedge = hedge
+        self.single_flight = SingleFlight() if coalesce else None
+        self.concurrency = max(1, int(concurrency))
+        self.loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._tasks = set()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="generation-engine", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = PrioritySemaphore(self.concurrency)
+        self._ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    def submit(self, prompt, force_refresh=False, on_chunk=None, priority=PRIORITY_BULK):
+        """Schedule one caption request; the Future resolves to the caption text."""
+        return self._schedule(self._generate(prompt, force_refresh, on_chunk, priority))
+
+    def submit_batch(self, rows, force_refresh=False, priority=PRIORITY_BULK):
+        """Schedule one batched request for (row_id, data) pairs; resolves to {row_id: caption or Exception}."""
+        return self._schedule(self._generate_batch(rows, force_refresh, priority))
+
+    def set_concurrency(self, concurrency):
+        """Change the in-flight limit; running requests finish, queued ones see the new limit."""
+        concurrency = max(1, int(concurrency))
+        if concurrency == self.concurrency:
+            return
+        self.concurrency = concurrency
+        self.loop.call_soon_threadsafe(self._semaphore.resize, concurrency)
+
+    def queue_depth(self):
+        """{priority name: {'queued', 'running'}} for every priority with work."""
+        return {PRIORITY_NAMES.get(priority, str(priority)): {'queued': queued, 'running': running}
+                for priority, (queued, running) in self._semaphore.depth().items()}
+
+    def format_queue_depth(self):
+        return ', '.join(f"{name} {d['queued']} queued/{d['running']} running"
+                         for name, d in self.queue_depth().items()) or "idle"
+
+    def cancel_all(self):
+        """Cancel every queued and in-flight request."""
+        def cancel():
+            for task in list(self._tasks):
+                task.cancel()
+        self.loop.call_soon_threadsafe(cancel)
+
+    def pending(self):
+        return len(self._tasks)
+
+    def close(self):
+        """Cancel every request, let the cancellations finish (resolving their Futures), then stop the loop."""
+        if not self.loop.is_running():
+            return
+
+        async def shutdown():
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        except Exception:
+            pass  # A request that ignores cancellation must not keep the window from closing
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+    def _schedule(self, coro):
+        return asyncio.run_coroutine_threadsafe(self._track(coro), self.loop)
+
+    async def _track(self, coro):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            return await coro
+        finally:
+            self._tasks.discard(task)
+
+    async def _generate(self, prompt, force_refresh, on_chunk, priority):
+        if on_chunk is None and self.single_flight is not None:
+            key = (cache_key(self.client.model_name, prompt, self.client.generation_config), force_refresh, priority)
+            return await self.single_flight.do(key, lambda: self._generate_once(prompt, force_refresh, None, priority))
+        return await self._generate_once(prompt, force_refresh, on_chunk, priority)
+
+    async def _generate_once(self, prompt, force_refresh, on_chunk, priority):
+        timeout = self.retry_policy.timeout
+        # The duplicate is not streamed; the card shows the primary's chunks until a winner is known
+        hedge_call = (lambda: (self.hedge.client or self.client).generate_async(
+            prompt, force_refresh=force_refresh, priority=priority, timeout=timeout)) if self.hedge is not None else None
+        return await self._call('caption_total', lambda chunk: self.client.generate_async(
+            prompt, force_refresh=force_refresh, on_chunk=chunk, priority=priority, timeout=timeout),
+            on_chunk, hedge_call, priority)
+
+    async def _generate_batch(self, rows, force_refresh, priority):
+        return await self._call('caption_batch', lambda chunk: self.client.generate_batch_async(
+            rows, force_refresh=force_refresh, priority=priority, timeout=self.retry_policy.timeout), priority=priority)
+
+    async def _call(self, step, call, on_chunk=None, hedge_call=None, priority=PRIORITY_BULK):
+        """
+        Await call(on_chunk) in a slot, with retries, the circuit breaker and optional hedging.
+
+        The per-attempt timeout is applied by the client around the API call
+        itself, so time spent waiting for rate-limit budget never times out.
+        """
+        policy = self.retry_policy
+        attempt = 1
+        while True:
+            queued = time.perf_counter()
+            async with self._semaphore.slot(priority):
+                start = time.perf_counter()
+                self._record('caption_queue', start - queued)
+                probe = self.breaker.check() if self.breaker is not None else False
+                chunk = self._first_token_timer(on_chunk, start) if on_chunk is not None else None
+                try:
+                    result = await self._race(call(chunk), hedge_call)
+                except asyncio.CancelledError:
+                    if probe:
+                        self.breaker.release_probe()
+                    raise
+                except Exception as e:
+                    error = e
+                else:
+                    elapsed = time.perf_counter() - start
+                    self._record(step, elapsed)
+                    if hedge_call is not None:
+                        self.hedge.observe(elapsed)
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    return result
+                self._record(step, time.perf_counter() - start, False)
+            if self.breaker is not None:
+                # Only failures that point at the service count against it; quota errors are pacing
+                if is_rate_limit_error(error):
+                    if probe:
+                        self.breaker.release_probe()
+                elif is_transient_error(error):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+            if not policy.should_retry(error, attempt):
+                raise error
+            delay = policy.backoff(attempt)
+            self._record('caption_backoff', delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _race(self, primary, hedge_call=None):
+        """Await primary; past the hedge delay also start hedge_call() and keep the first success."""
+        if hedge_call is None:
+            return await primary
+        self.hedge.record_request()
+        primary = asyncio.ensure_future(primary)
+        delay = self.hedge.delay()
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.hedge.try_hedge():
+            return await primary
+        backup = asyncio.ensure_future(hedge_call())
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge.record_win()
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in (primary, backup):
+                if not task.done():
+                    task.cancel()
+
+    def _first_token_timer(self, on_chunk, start):
+        seen = []
+
+        def wrapped(text):
+            if not seen:
+                seen.append(True)
+                self._record('caption_first_token', time.perf_counter() - start)
+            on_chunk(text)
+        return wrapped
+
+    def _record(self, step, seconds, ok=True):
+        if self.metrics is not None:
+            self.metrics.record(step, seconds, ok)
+
+
+def _read_sheet(path):
+    return pd.read_excel(path) if path.lower().endswith(('.xlsx', '.xls')) else pd.read_csv(path)
+
+
+def _previous_captions(path):
+    """{fingerprint: caption} from an earlier output file, for rows that succeeded."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        old = _read_sheet(path)
+    except Exception:
+        return {}
+    if 'fingerprint' not in old or 'generated_caption' not in old:
+        return {}
+    return {fp: caption for fp, caption in zip(old['fingerprint'], old['generated_caption'])
+            if isinstance(fp, str) and fp and isinstance(caption, str)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate captions for an Excel sheet without the GUI")
+    parser.add_argument('excel', help="Input sheet (same columns as the GUI expects)")
+    parser.add_argument('--out', help="Output .csv or .xlsx (default: <input>_captions.csv)")
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'), help="Defaults to $GEMINI_API_KEY")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--rpm', type=int, default=15, help="Requests-per-minute quota")
+    parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight")
+    parser.add_argument('--force-refresh', action='store_true', help="Regenerate every row, ignoring cached captions")
+    parser.add_argument('--similar', type=float, help="Reuse captions of prompts at least this similar (e.g. 0.97; needs numpy)")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds one request may take")
+    parser.add_argument('--attempts', type=int, default=3, help="Attempts per row on transient errors")
+    parser.add_argument('--hedge', action='store_true', help="Duplicate requests slower than the recent p95")
+    parser.add_argument('--hedge-model', help="Send duplicates to this model instead (e.g. gemini-1.5-flash)")
+    parser.add_argument('--hedge-budget', type=float, default=0.1, help="Duplicates allowed per request")
+    args = parser.parse_args()
+
+    if pd is None:
+        parser.error("pandas not installed")
+    if not args.api_key:
+        parser.error("no API key (use --api-key or GEMINI_API_KEY)")
+
+    data = pd.read_excel(args.excel)
+    out = args.out or os.path.splitext(args.excel)[0] + '_captions.csv'
+    # Rows whose prompt inputs match a successful row of the previous output are copied, not regenerated
+    fingerprints = [row_fingerprint(row) for _, row in data.iterrows()]
+    previous = {} if args.force_refresh else _previous_captions(out)
+    metrics = StepMetrics()
+    cache = CaptionCache()
+    rate_limiter = AdaptiveRateLimiter(requests_per_minute=args.rpm)
+    semantic = SemanticCache(args.model, threshold=args.similar) if args.similar else None
+    client = GeminiClient(args.api_key, args.model, cache=cache, rate_limiter=rate_limiter, semantic_cache=semantic)
+    hedge = None
+    if args.hedge or args.hedge_model:
+        fallback = GeminiClient(model_name=args.hedge_model, cache=cache, rate_limiter=rate_limiter) if args.hedge_model else None
+        hedge = HedgePolicy(fallback, budget=args.hedge_budget)
+    engine = GenerationEngine(client, args.concurrency, metrics, retry_policy=RetryPolicy(args.attempts, args.timeout),
+                              breaker=CircuitBreaker(), hedge=hedge)
+    captions = [previous.get(fp, '') for fp in fingerprints]
+    ok = [fp in previous for fp in fingerprints]
+    reused = sum(ok)
+    failed = 0
+    try:
+        futures = {engine.submit(build_caption_prompt(row), args.force_refresh): i
+                   for i, (_, row) in enumerate(data.iterrows()) if not ok[i]}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                captions[i] = future.result()
+                ok[i] = True
+            except Exception as e:
+                failed += 1
+                captions[i] = f"Generation failed: {e}"[:500]
+            print(f"\rGenerated {done}/{len(futures)}", end='', flush=True)
+        print()
+    except KeyboardInterrupt:
+        print("\nCancelled")
+    finally:
+        engine.close()
+
+    data['generated_caption'] = captions
+    # Only successful captions carry a fingerprint, so failed or unfinished rows are retried next run
+    data['fingerprint'] = [fp if done else '' for fp, done in zip(fingerprints, ok)]
+    if out.lower().endswith(('.xlsx', '.xls')):
+        data.to_excel(out, index=False)
+    else:
+        data.to_csv(out, index=False)
+    for line in metrics.format_lines():
+        print(line)
+    coalesced = engine.single_flight.stats()['coalesced']
+    if coalesced:
+        print(f"{coalesced} duplicate prompts shared an in-flight request")
+    if hedge is not None:
+        h = hedge.stats()
+        print(f"hedging: {h['hedged']}/{h['requests']} requests hedged, {h['wins']} won by the duplicate "
+              f"({h['win_rate']:.0%}), {h['denied']} over budget")
+    stats = cache.stats()
+    print(f"{sum(ok)} captions ({reused} unchanged rows reused), {failed} failed, "
+          f"cache {stats['hits']} hits / {stats['misses']} misses")
+    if semantic is not None:
+        sem = semantic.stats()
+        print(f"similar-prompt cache: {sem['hits']} hits / {sem['misses']} misses ({sem['entries']} indexed)")
+        semantic.close()
+    print(f"Saved to {out}")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
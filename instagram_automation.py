@@ -3,12 +3,19 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
 import os
 
+from waits import (StepWaiter, StepTimeout, NEW_POST_BUTTON, FILE_INPUT, CAPTION_EDITOR, element_present,
+                   element_clickable)
+from browser_actions import button_clicked, click_released, insert_text, watch_share_result, wait_for_share_result
+from session_store import SessionStore, INSTAGRAM_URL, session_active, login_succeeded
+
 class InstagramAutomator:
-    def __init__(self):
+    def __init__(self, timeout=20, poll_interval=0.25, session_store=None, base_url=INSTAGRAM_URL):
         self.driver = None
+        self.waiter = StepWaiter(timeout=timeout, poll_interval=poll_interval)
+        self.sessions = session_store or SessionStore()
+        self.base_url = base_url
         self.setup_driver()
     
     def setup_driver(self):
@@ -16,27 +23,36 @@ class InstagramAutomator:
         chrome_options = Options()
         chrome_options.add_argument("--start-maximized")
         self.driver = webdriver.Chrome(options=chrome_options)
+        self.waiter.driver = self.driver
     
     def login(self, username, password):
         """Login to Instagram"""
+        if self.sessions.restore(self.driver, username, self.base_url):
+            if session_active(self.waiter):
+                self.sessions.save(self.driver, username)
+                print("Restored saved session")
+                return
+            print("Saved session expired, logging in again...")
+            self.sessions.clear(username)
+        
         print("Navigating to Instagram...")
-        self.driver.get("https://www.instagram.com/")
-        time.sleep(3)
+        self.driver.get(self.base_url)
         
         print("Entering credentials...")
-        self.driver.find_element(By.NAME, "username").send_keys(username)
+        self.waiter.until("username_field", element_clickable("//input[@name='username']")).send_keys(username)
         self.driver.find_element(By.NAME, "password").send_keys(password)
         
         print("Clicking login button...")
         button = self.driver.find_element(By.XPATH, "//button[@type='submit']")
         button.click()
-        time.sleep(5)
+        if not login_succeeded(self.waiter):
+            raise StepTimeout("login_result: no session after submit (wrong credentials or checkpoint?)")
+        self.sessions.save(self.driver, username)
     
     def create_new_post(self):
         """Click on new post button"""
         print("Clicking new post button...")
-        self.driver.find_element(By.XPATH, "//*[@aria-label='New post']").click()
-        time.sleep(3)
+        self.waiter.until("new_post", element_clickable(NEW_POST_BUTTON)).click()
     
     def upload_image(self, image_path):
         """Upload image file"""
@@ -44,42 +60,32 @@ class InstagramAutomator:
             raise FileNotFoundError(f"Image file not found: {image_path}")
         
         print(f"Uploading image: {image_path}")
-        self.driver.find_element(By.XPATH, "//input[@type='file']").send_keys(image_path)
-        time.sleep(3)
+        self.waiter.until("file_input", element_present(FILE_INPUT)).send_keys(image_path)
     
     def navigate_next_steps(self):
         """Click Next buttons twice to proceed"""
         print("Navigating through post creation steps...")
-        buttons = self.driver.find_elements(By.XPATH, "//*[@role='button']")
         for i in range(2):
-            for btn in buttons:
-                try:
-                    if btn.text.strip().lower() == "next":
-                        btn.click()
-                        break
-                except:
-                    pass
-            time.sleep(2)
-            # Refresh button list for next iteration
-            buttons = self.driver.find_elements(By.XPATH, "//*[@role='button']")
+            token = self.waiter.until(f"next_{i + 1}", button_clicked("next"))
+            self.waiter.until(f"next_{i + 1}_advance", click_released(token), timeout=2, raise_on_timeout=False)
     
     def add_caption(self, caption):
         """Add caption to the post"""
         print("Adding caption...")
-        caption_field = self.driver.find_element(By.XPATH, "//*[@data-lexical-editor='true']")
-        caption_field.clear()
-        caption_field.send_keys(caption)
-        time.sleep(2)
+        caption_field = self.waiter.until("caption_editor", element_present(CAPTION_EDITOR))
+        insert_text(self.driver, caption_field, caption)
     
     def share_post(self):
         """Share the post"""
         print("Sharing post...")
-        buttons = self.driver.find_elements(By.XPATH, "//*[@role='button']")
-        for btn in buttons:
-            if btn.text.strip().lower() == "share":
-                btn.click()
-                break
-        time.sleep(3)
+        watch_share_result(self.driver)
+        self.waiter.until("share", button_clicked("share"))
+        state, text = wait_for_share_result(self.driver)
+        print(f"Step waits: {self.waiter.summary()}")
+        if state == 'failed':
+            raise RuntimeError(f"Instagram reported: {text}")
+        if state != 'shared':
+            raise RuntimeError("Post not confirmed by Instagram")
         print("Post shared successfully!")
     
     def automate_post(self, username, password, image_path, caption):
@@ -92,9 +98,8 @@ class InstagramAutomator:
             self.add_caption(caption)
             self.share_post()
             print("Automation completed successfully!")
-            time.sleep(5)
             self.driver.refresh()
-            time.sleep(5)
+            self.waiter.until("home_reload", element_present(NEW_POST_BUTTON), raise_on_timeout=False)
         except Exception as e:
             print(f"Error during automation: {e}")
         finally:
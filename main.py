@@ -32,7 +32,6 @@ except ImportError:
 # Selenium for uploading
 try:
     from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
@@ -40,35 +39,124 @@ try:
 except ImportError:
     webdriver = None
 
+from waits import StepWaiter, NEW_POST_BUTTON, FILE_INPUT, CAPTION_EDITOR, element_present, element_clickable
+from browser_actions import button_clicked, click_released, insert_text, watch_share_result, wait_for_share_result
+from session_store import SessionStore, INSTAGRAM_URL, session_active, login_succeeded
+from driver_pool import UploaderPool
+from metrics import StepMetrics
+from chrome_profiles import build_chrome_options, apply_network_blocking
+from gemini_client import GeminiClient, DEFAULT_MODEL, build_caption_prompt, row_fingerprint
+from caption_cache import CaptionCache
+from caption_ledger import CaptionLedger
+from semantic_cache import SemanticCache
+from rate_limiter import AdaptiveRateLimiter
+from generation_engine import PRIORITY_INTERACTIVE, GenerationEngine
+from pipeline import Pipeline, Stage
+from resilience import RetryPolicy, CircuitBreaker, HedgePolicy
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout, CancelledError, as_completed
+
+# Spreadsheet columns that route a row to a specific Instagram account
+ACCOUNT_COLUMN = 'account'
+ACCOUNT_PASSWORD_COLUMN = 'account_password'
+# Hedge combobox choices besides a fallback model name
+HEDGE_OFF = 'Off'
+HEDGE_SAME_MODEL = 'Same model'
+# Similarity thresholds offered for reusing captions of near-duplicate prompts, measured on a row's
+# theme + context: punctuation, case and spacing score 1.0; one changed word in a long theme about
+# 0.955-0.97; a changed date or percentage 0.81-0.97. Below 0.95 different offers start to match
+SIMILAR_OFF = 'Off'
+SIMILAR_THRESHOLDS = ('0.99', '0.97', '0.95')
+
 class InstagramUploader:
-    """Handles Instagram browser automation (single and batch uploads)."""
-    def __init__(self, status_callback=lambda m: None):
+    """Handles Instagram browser automation (single and batch uploads).
+
+    headless runs new-style headless Chrome with a fixed window_size viewport.
+    performance uses the 'eager' page-load strategy, trims background Chrome
+    features and blocks blocked_urls (video, fonts, third-party scripts by
+    default) so more browsers fit on one machine for unattended batches.
+    """
+    def __init__(self, status_callback=lambda m: None, wait_timeout=20, poll_interval=0.25, session_store=None,
+                 start_async=True, base_url=INSTAGRAM_URL, metrics=None, headless=False, performance=False,
+                 window_size=(1280, 900), blocked_urls=None, share_timeout=60):
         self.driver = None
+        self.share_timeout = share_timeout
+        self.headless = headless
+        self.performance = performance
+        self.window_size = window_size
+        self.blocked_urls = blocked_urls
+        self.base_url = base_url
+        self.metrics = metrics or StepMetrics()
+        self.account = None
         self.stop_event = threading.Event()
         self.status_callback = status_callback
         self.lock = threading.Lock()
-        self._init_driver()
+        self.sessions = session_store or SessionStore()
+        self.waiter = StepWaiter(timeout=wait_timeout, poll_interval=poll_interval, stop_event=self.stop_event)
+        # Resolves to True/False once Chrome has started (or failed to)
+        self.ready = Future()
+        self._closed = False
+        if start_async:
+            threading.Thread(target=self._warm_up, daemon=True).start()
+        else:
+            self._warm_up()
+
+    def _warm_up(self):
+        try:
+            self._init_driver()
+        finally:
+            if self._closed:
+                self.close()
+            self.ready.set_result(self.driver is not None)
+
+    def wait_until_ready(self, timeout=None):
+        """Block until browser startup finishes; True if a driver is available."""
+        try:
+            return self.ready.result(timeout)
+        except FutureTimeout:
+            return False
+
+    def available(self):
+        """False only once startup has finished without a browser."""
+        return not self.ready.done() or self.driver is not None
 
     def _init_driver(self):
         if webdriver is None:
             self.status_callback("Selenium not installed. Upload disabled.")
             return
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--start-maximized")
+            chrome_options = build_chrome_options(self.headless, self.performance, self.window_size)
             self.driver = webdriver.Chrome(options=chrome_options)
-            self.status_callback("Chrome launched")
+            self.waiter.driver = self.driver
+            if self.performance:
+                try:
+                    apply_network_blocking(self.driver, self.blocked_urls)
+                except Exception as e:
+                    self.status_callback(f"Warning: could not block resources: {e}")
+            self.status_callback("Chrome launched" + (" (headless)" if self.headless else ""))
         except Exception as e:
             self.status_callback(f"Failed to start Chrome: {e}")
             self.driver = None
 
     def login(self, username, password):
-        if not self.driver:
+        if not self.ready.done():
+            self.status_callback("Waiting for Chrome to finish starting...")
+        if not self.wait_until_ready():
             self.status_callback("Driver not available")
             return False
         try:
+            if self.sessions.restore(self.driver, username, self.base_url):
+                if session_active(self.waiter):
+                    self.sessions.save(self.driver, username)
+                    self.account = username
+                    self.status_callback(f"Restored saved session for {username}")
+                    return True
+                self.status_callback("Saved session expired; logging in again")
+                self.sessions.clear(username)
             self.status_callback("Opening Instagram login page...")
-            self.driver.get("https://www.instagram.com/")
+            # Drop any other account's session so the login form is shown
+            self.account = None
+            self.driver.delete_all_cookies()
+            self.driver.get(self.base_url)
             WebDriverWait(self.driver, 20).until(EC.presence_of_element_located((By.NAME, "username")))
             u = self.driver.find_element(By.NAME, "username")
             p = self.driver.find_element(By.NAME, "password")
@@ -76,7 +164,11 @@ class InstagramUploader:
             p.clear(); p.send_keys(password)
             self.status_callback("Submitting credentials...")
             self.driver.find_element(By.XPATH, "//button[@type='submit']").click()
-            WebDriverWait(self.driver, 30).until(lambda d: "accounts/login" not in d.current_url)
+            if not login_succeeded(self.waiter):
+                self.status_callback("Login failed - no session after submit (wrong credentials or checkpoint?)")
+                return False
+            self.sessions.save(self.driver, username)
+            self.account = username
             self.status_callback("Login successful")
             return True
         except TimeoutException:
@@ -86,64 +178,59 @@ class InstagramUploader:
         return False
 
     def _click_new_post(self):
-        WebDriverWait(self.driver, 20).until(EC.element_to_be_clickable((By.XPATH, "//*[@aria-label='New post']"))).click()
-        time.sleep(2)
+        self.waiter.until("new_post", element_clickable(NEW_POST_BUTTON)).click()
 
     def _upload_image(self, image_path):
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image not found: {image_path}")
-        inp = WebDriverWait(self.driver, 20).until(EC.presence_of_element_located((By.XPATH, "//input[@type='file']")))
+        inp = self.waiter.until("file_input", element_present(FILE_INPUT))
         inp.send_keys(os.path.abspath(image_path))
-        time.sleep(2)
 
     def _next_steps(self, count=2):
-        for _ in range(count):
-            buttons = self.driver.find_elements(By.XPATH, "//*[@role='button']")
-            clicked = False
-            for b in buttons:
-                try:
-                    if b.text.strip().lower() == "next":
-                        b.click(); clicked = True; break
-                except Exception:
-                    pass
-            if not clicked:
-                time.sleep(1)
-            time.sleep(1.5)
+        for i in range(count):
+            token = self.waiter.until(f"next_{i+1}", button_clicked("next"))
+            # Let the dialog advance so the same Next button is not clicked twice
+            self.waiter.until(f"next_{i+1}_advance", click_released(token), timeout=2, raise_on_timeout=False)
 
     def _add_caption(self, caption):
-        field = WebDriverWait(self.driver, 20).until(EC.presence_of_element_located((By.XPATH, "//*[@data-lexical-editor='true']")))
+        field = self.waiter.until("caption_editor", element_present(CAPTION_EDITOR))
         field.click()
-        try:
-            field.clear()
-        except Exception:
-            pass
-        field.send_keys(caption[:2200])
-        time.sleep(1)
+        if insert_text(self.driver, field, caption[:2200]) != 'script':
+            self.status_callback("Caption typed with send_keys fallback")
 
     def _share(self):
-        buttons = self.driver.find_elements(By.XPATH, "//*[@role='button']")
-        for b in buttons:
-            try:
-                if b.text.strip().lower() == "share":
-                    b.click(); return True
-            except Exception:
-                pass
-        return False
+        return bool(self.waiter.until("share", button_clicked("share"), raise_on_timeout=False))
 
     def upload_post(self, image_path, caption):
         with self.lock:
             if self.stop_event.is_set():
                 return False, "Stopped"
+            if not self.wait_until_ready():
+                return False, "Browser not available"
             try:
                 self.status_callback("Starting new post upload...")
-                self._click_new_post()
-                self._upload_image(image_path)
-                self._next_steps()
-                self._add_caption(caption or "")
-                if not self._share():
-                    raise RuntimeError("Share button not found")
-                self.status_callback("Post shared; waiting for completion")
-                time.sleep(5)
+                self.waiter.reset()
+                with self.metrics.span("upload_post"):
+                    with self.metrics.span("click_new_post"):
+                        self._click_new_post()
+                    with self.metrics.span("upload_image"):
+                        self._upload_image(image_path)
+                    with self.metrics.span("next_steps"):
+                        self._next_steps()
+                    with self.metrics.span("add_caption"):
+                        self._add_caption(caption or "")
+                    with self.metrics.span("share"):
+                        watch_share_result(self.driver)
+                        if not self._share():
+                            raise RuntimeError("Share button not found")
+                    self.status_callback(f"Step waits: {self.waiter.summary()}")
+                    self.status_callback("Share clicked; waiting for confirmation")
+                    with self.metrics.span("post_share_wait"):
+                        state, text = wait_for_share_result(self.driver, self.share_timeout)
+                    if state == 'failed':
+                        raise RuntimeError(f"Instagram reported: {text}")
+                    if state != 'shared':
+                        raise RuntimeError(f"No share confirmation within {self.share_timeout}s")
                 return True, "Uploaded"
             except Exception as e:
                 self.status_callback(f"Upload failed: {e}")
@@ -159,6 +246,8 @@ class InstagramUploader:
             self.status_callback("Stop flag cleared")
 
     def close(self):
+        # A browser still starting up is closed by _warm_up when it finishes
+        self._closed = True
         try:
             if self.driver:
                 self.driver.quit()
@@ -174,17 +263,44 @@ class SocialMediaGeneratorV4:
         self.root.configure(bg='#f5f5f5')
 
         self.gemini_api_key = ""
+        self.gemini_client = None
+        self.generation_engine = None
+        # Passed to the model as-is, e.g. {'temperature': 0.9, 'max_output_tokens': 512}
+        self.generation_config = {}
+        self.rate_limiter = None
+        try:
+            self.caption_cache = CaptionCache()
+        except Exception:
+            self.caption_cache = None
+        self.semantic_cache = None
         self.data = None
         self.cards = []
+        # Captions recorded per row fingerprint for the loaded sheet
+        self.caption_ledger = None
+        # Retry queue: cards whose last generation attempt failed, by index
+        self.failed_cards = {}
         self.generated_data = []
-        self.uploader = InstagramUploader(status_callback=self._log_and_status)
+        self.generated_lock = threading.Lock()
         self.upload_thread = None
+        # Account logged in through the GUI; rows without an account column are posted there
+        self.gui_account = None
+        self.pipeline = None
+        # Per-step upload timings, shared by every browser and flushed after each batch
+        self.upload_metrics = StepMetrics()
+        # Caption latency: time to first streamed token and total
+        self.generation_metrics = StepMetrics()
 
         self._build_ui()
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
         
         # Add initial log entry
-        self._add_log("Application started - Chrome browser launched", "INFO")
+        self._add_log("Application started - Chrome starting in background", "INFO")
+        
+        # Chrome starts on a background thread; upload actions wait for it
+        self.uploader = InstagramUploader(status_callback=self._log_and_status, metrics=self.upload_metrics)
+        self.pool = UploaderPool(lambda: InstagramUploader(status_callback=self._log_and_status, start_async=False,
+                                                           metrics=self.upload_metrics),
+                                 primary=self.uploader)
 
     # UI BUILD
     def _build_ui(self):
@@ -232,7 +348,29 @@ class SocialMediaGeneratorV4:
         ttk.Label(api_frame, text="Gemini API Key:", style='Title.TLabel').grid(row=0, column=0, sticky='w')
         self.api_entry = ttk.Entry(api_frame, show='*', font=('Consolas', 9))
         self.api_entry.grid(row=0, column=1, sticky='ew', padx=(10, 5))
-        ttk.Button(api_frame, text="Set API Key", command=self._set_api_key, style='Header.TButton').grid(row=0, column=2)
+        ttk.Label(api_frame, text="Model:").grid(row=0, column=2, padx=(5, 4))
+        self.model_var = tk.StringVar(value=DEFAULT_MODEL)
+        ttk.Combobox(api_frame, textvariable=self.model_var, width=24,
+                     values=[DEFAULT_MODEL, 'gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-1.5-pro']).grid(row=0, column=3, padx=(0, 5))
+        # Requests-per-minute quota; generation is paced to stay under it
+        ttk.Label(api_frame, text="RPM:").grid(row=0, column=4, padx=(0, 4))
+        self.rpm_var = tk.IntVar(value=15)
+        ttk.Spinbox(api_frame, from_=1, to=10000, width=6, textvariable=self.rpm_var).grid(row=0, column=5, padx=(0, 5))
+        # Rows sent per Gemini request during Generate All (1 = one request per row)
+        ttk.Label(api_frame, text="Rows/request:").grid(row=0, column=6, padx=(0, 4))
+        self.batch_size_var = tk.IntVar(value=1)
+        ttk.Spinbox(api_frame, from_=1, to=20, width=3, textvariable=self.batch_size_var).grid(row=0, column=7, padx=(0, 5))
+        # Duplicate requests slower than the recent p95, to the same or a faster fallback model
+        ttk.Label(api_frame, text="Hedge:").grid(row=0, column=8, padx=(0, 4))
+        self.hedge_var = tk.StringVar(value=HEDGE_OFF)
+        ttk.Combobox(api_frame, textvariable=self.hedge_var, width=18, state='readonly',
+                     values=[HEDGE_OFF, HEDGE_SAME_MODEL, 'gemini-1.5-flash', 'gemini-2.0-flash']).grid(row=0, column=9, padx=(0, 5))
+        # Reuse the caption of an earlier prompt at least this similar (cosine); needs numpy
+        ttk.Label(api_frame, text="Similar:").grid(row=0, column=10, padx=(0, 4))
+        self.similar_var = tk.StringVar(value=SIMILAR_OFF)
+        ttk.Combobox(api_frame, textvariable=self.similar_var, width=6, state='readonly',
+                     values=[SIMILAR_OFF, *SIMILAR_THRESHOLDS]).grid(row=0, column=11, padx=(0, 5))
+        ttk.Button(api_frame, text="Set API Key", command=self._set_api_key, style='Header.TButton').grid(row=0, column=12)
 
         # Row 1: Instagram Credentials
         cred_frame = ttk.Frame(control_frame)
@@ -263,16 +401,34 @@ class SocialMediaGeneratorV4:
         action_frame = ttk.Frame(control_frame)
         action_frame.grid(row=3, column=0, columnspan=5, sticky='ew', pady=(10, 5))
         
-        ttk.Button(action_frame, text="⚡ Generate All Content", command=self._generate_all, style='Header.TButton').grid(row=0, column=0, padx=(0, 10))
-        ttk.Button(action_frame, text="🚀 Upload All Posts", command=self._upload_all_generated, style='Header.TButton').grid(row=0, column=1, padx=(0, 10))
-        ttk.Button(action_frame, text="⏹️ Stop Upload", command=self._stop_uploading, style='Action.TButton').grid(row=0, column=2, padx=(0, 20))
+        ttk.Button(action_frame, text="⚡ Generate All Content", command=self._generate_all, style='Header.TButton').grid(row=0, column=0, padx=(0, 4))
+        
+        # Gemini requests in flight at once on the generation engine
+        ttk.Label(action_frame, text="Workers:").grid(row=0, column=1, padx=(0, 4))
+        self.generation_workers_var = tk.IntVar(value=4)
+        ttk.Spinbox(action_frame, from_=1, to=32, width=3, textvariable=self.generation_workers_var).grid(row=0, column=2, padx=(0, 4))
+        # Skip the caption cache and call Gemini again for every row
+        self.force_refresh_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(action_frame, text="Force refresh", variable=self.force_refresh_var).grid(row=0, column=3, padx=(0, 10))
+        # Regenerate only the posts whose caption failed in the last run
+        ttk.Button(action_frame, text="↻ Retry Failed", command=self._retry_failed, style='Action.TButton').grid(row=0, column=4, padx=(0, 10))
+        
+        ttk.Button(action_frame, text="🚀 Upload All Posts", command=self._upload_all_generated, style='Header.TButton').grid(row=0, column=5, padx=(0, 10))
+        # Generate, render and upload at the same time: post 1 uploads while later posts are still generating
+        ttk.Button(action_frame, text="🔁 Generate + Upload", command=self._generate_and_upload, style='Header.TButton').grid(row=0, column=6, padx=(0, 10))
+        ttk.Button(action_frame, text="⏹️ Stop", command=self._stop, style='Action.TButton').grid(row=0, column=7, padx=(0, 10))
+        
+        # Number of browsers used when rows target different accounts
+        ttk.Label(action_frame, text="Browsers:").grid(row=0, column=8, padx=(0, 4))
+        self.pool_size_var = tk.IntVar(value=2)
+        ttk.Spinbox(action_frame, from_=1, to=8, width=3, textvariable=self.pool_size_var).grid(row=0, column=9, padx=(0, 20))
         
         # Progress and status
         self.progress = ttk.Progressbar(action_frame, mode='indeterminate', length=200)
-        self.progress.grid(row=0, column=3, padx=(0, 10))
+        self.progress.grid(row=0, column=10, padx=(0, 10))
         
         self.status_label = ttk.Label(action_frame, text="Ready", foreground='#27ae60', font=('Segoe UI', 9, 'bold'))
-        self.status_label.grid(row=0, column=4)
+        self.status_label.grid(row=0, column=11)
 
     def _build_cards_area(self, parent):
         # Cards area with improved styling
@@ -328,6 +484,10 @@ class SocialMediaGeneratorV4:
         """Add a log entry with timestamp and color coding"""
         if not hasattr(self, 'logs_text'):
             return
+        if threading.current_thread() is not threading.main_thread():
+            # Worker threads hand the entry to the Tk event loop
+            self.root.after(0, lambda: self._add_log(message, level))
+            return
             
         timestamp = datetime.now().strftime("%H:%M:%S")
         
@@ -394,10 +554,39 @@ class SocialMediaGeneratorV4:
             self._add_log("API key setup failed - google-generativeai not installed", "ERROR")
             return
         try:
-            genai.configure(api_key=key)
+            model_name = self.model_var.get().strip() or DEFAULT_MODEL
+            try:
+                rpm = max(1, int(self.rpm_var.get()))
+            except (tk.TclError, ValueError):
+                rpm = 15
+            self.rate_limiter = AdaptiveRateLimiter(requests_per_minute=rpm)
+            if self.semantic_cache:
+                self.semantic_cache.close()
+                self.semantic_cache = None
+            if self.similar_var.get() != SIMILAR_OFF:
+                try:
+                    self.semantic_cache = SemanticCache(model_name, threshold=float(self.similar_var.get()))
+                except Exception as e:
+                    self._add_log(f"Similar-prompt reuse disabled: {e}", "WARNING")
+            self.gemini_client = GeminiClient(key, model_name, self.generation_config, cache=self.caption_cache,
+                                              rate_limiter=self.rate_limiter, semantic_cache=self.semantic_cache)
+            hedge = None
+            hedge_choice = self.hedge_var.get()
+            if hedge_choice == HEDGE_SAME_MODEL:
+                hedge = HedgePolicy()
+            elif hedge_choice != HEDGE_OFF:
+                hedge = HedgePolicy(GeminiClient(model_name=hedge_choice, generation_config=self.generation_config,
+                                                 cache=self.caption_cache, rate_limiter=self.rate_limiter))
+            if self.generation_engine:
+                self.generation_engine.close()
+            self.generation_engine = GenerationEngine(self.gemini_client, self.generation_workers_var.get(),
+                                                      metrics=self.generation_metrics, retry_policy=RetryPolicy(),
+                                                      breaker=CircuitBreaker(), hedge=hedge)
             self.gemini_api_key = key
             messagebox.showinfo("API", "API key set")
-            self._add_log("Gemini API key configured successfully", "SUCCESS")
+            self._add_log(f"Gemini API key configured successfully (model: {model_name}, {rpm} RPM"
+                          + (f", hedge: {hedge_choice}" if hedge else "")
+                          + (f", similar >= {self.semantic_cache.threshold}" if self.semantic_cache else "") + ")", "SUCCESS")
         except Exception as e:
             messagebox.showerror("API", f"Failed: {e}")
             self._add_log(f"API key setup failed: {e}", "ERROR")
@@ -415,10 +604,14 @@ class SocialMediaGeneratorV4:
         try:
             self._add_log(f"Loading Excel file: {os.path.basename(path)}", "INFO")
             self.data = pd.read_excel(path)
+            self.caption_ledger = CaptionLedger.for_sheet(path)
             self.file_label.config(text=f"Loaded {os.path.basename(path)} ({len(self.data)} rows)")
             self._add_log(f"Excel file loaded successfully - {len(self.data)} rows found", "SUCCESS")
             self._build_cards()
             self._add_log(f"Created {len(self.cards)} content cards", "INFO")
+            restored = sum(1 for card in self.cards if self.caption_ledger.is_current(card.fingerprint))
+            if restored:
+                self._add_log(f"Restored {restored} captions saved for unchanged rows", "INFO")
         except Exception as e:
             messagebox.showerror("File", f"Failed to read: {e}")
             self._add_log(f"File loading failed: {e}", "ERROR")
@@ -427,6 +620,7 @@ class SocialMediaGeneratorV4:
     def _build_cards(self):
         for w in self.inner.winfo_children(): w.destroy()
         self.cards.clear()
+        self.failed_cards.clear()
         if self.data is None: return
         for idx, row in self.data.iterrows():
             card = ttk.LabelFrame(self.inner, text=f"Post #{idx+1}", padding=10)
@@ -464,27 +658,123 @@ class SocialMediaGeneratorV4:
             card.caption_widget = cap_box
             card.image_widget = img_label
             card.generated_image_path = None
+            card.fingerprint = row_fingerprint(row)
+            saved = self.caption_ledger.get(card.fingerprint) if self.caption_ledger else None
+            if saved and saved.get('ok'):
+                cap_box.insert(tk.END, saved['caption'])
             self.cards.append(card)
 
     # GENERATION
-    def _generate_all(self):
+    def _generate_all(self, cards=None):
         if not self.gemini_api_key:
             messagebox.showwarning("Generate", "Set API key first")
             self._add_log("Generation failed - API key not set", "WARNING")
             return
-        if not self.cards:
+        cards = list(self.cards if cards is None else cards)
+        if not cards:
             messagebox.showwarning("Generate", "Load data first")
             self._add_log("Generation failed - No data loaded", "WARNING")
             return
-        self._add_log(f"Starting generation for {len(self.cards)} posts", "INFO")
+        try:
+            workers = max(1, int(self.generation_workers_var.get()))
+        except (tk.TclError, ValueError):
+            workers = 1
+        try:
+            batch_size = max(1, int(self.batch_size_var.get()))
+        except (tk.TclError, ValueError):
+            batch_size = 1
+        force_refresh = self.force_refresh_var.get()
+        # Rows whose prompt inputs are unchanged since their last successful caption are not sent again
+        reused = []
+        if self.caption_ledger and not force_refresh:
+            model = self.gemini_client.model_name
+            reused = [card for card in cards if self.caption_ledger.is_current(card.fingerprint, model)]
+            cards = [card for card in cards if not self.caption_ledger.is_current(card.fingerprint, model)]
+        self._add_log(f"Starting generation for {len(cards)} posts ({workers} workers"
+                      + (f", {batch_size} rows/request" if batch_size > 1 else "")
+                      + (f", {len(reused)} unchanged rows reused" if reused else "")
+                      + (", cache bypassed)" if force_refresh else ")"), "INFO")
         self.progress.start()
-        threading.Thread(target=self._generate_all_worker, daemon=True).start()
+        self.generation_engine.set_concurrency(workers)
+        threading.Thread(target=lambda: self._generate_all_worker(cards, force_refresh, batch_size, reused),
+                         daemon=True).start()
+
+    def _retry_failed(self):
+        with self.generated_lock:
+            cards = sorted(self.failed_cards.values(), key=lambda c: c.index)
+        if not cards:
+            messagebox.showinfo("Generate", "No failed posts to retry")
+            return
+        self._generate_all(cards)
 
-    def _generate_all_worker(self):
-        for i, card in enumerate(self.cards):
-            self._add_log(f"Generating content for post {i+1}/{len(self.cards)}", "INFO")
-            self._generate_for_card(card)
+    def _generate_all_worker(self, cards, force_refresh=False, batch_size=1, reused=()):
+        total = len(cards) + len(reused)
+        done = 0
+        cancelled = 0
+        before = self.caption_cache.stats() if self.caption_cache else None
+        engine = self.generation_engine
+        # Requests run on the engine's event loop; this thread only collects results.
+        # Each card writes its own generated_data slot, so completion order does not matter
+        if batch_size > 1:
+            batches = [cards[i:i + batch_size] for i in range(0, len(cards), batch_size)]
+            futures = {engine.submit_batch([(str(card.index), card.data) for card in batch], force_refresh): batch
+                       for batch in batches}
+        else:
+            futures = {engine.submit(build_caption_prompt(card.data), force_refresh): [card] for card in cards}
+        # Reused rows only need their image and export record while the requests run
+        for card in reused:
+            self._finish_card(card, self.caption_ledger.get(card.fingerprint)['caption'])
+            done += 1
+            self._set_status(f"Generated {done}/{total}")
+        for future in as_completed(futures):
+            group = futures[future]
+            if future.cancelled():
+                cancelled += len(group)
+            for card, caption in self._caption_results(group, future):
+                self._finish_card(card, caption)
+            done += len(group)
+            self._set_status(f"Generated {done}/{total} - queue: {engine.format_queue_depth()}")
         self.root.after(0, self.progress.stop)
+        if before is not None:
+            after = self.caption_cache.stats()
+            self._add_log(f"Caption cache: {after['hits'] - before['hits']} hits, "
+                          f"{after['misses'] - before['misses']} misses ({after['entries']} cached)", "INFO")
+        if self.semantic_cache:
+            sem = self.semantic_cache.stats()
+            self._add_log(f"Similar-prompt cache: {sem['hits']} hits, {sem['misses']} misses ({sem['entries']} indexed)", "INFO")
+        if self.rate_limiter:
+            stats = self.rate_limiter.stats()
+            self._add_log(f"Rate limiter: {stats['requests_per_minute']} RPM now, {stats['rate_limited']} quota errors, "
+                          f"{stats['waited_seconds']}s spent pacing", "INFO")
+        self._save_caption_ledger()
+        breaker = engine.breaker.stats() if engine.breaker else None
+        if breaker and breaker['opened']:
+            self._add_log(f"Circuit breaker opened {breaker['opened']} times, {breaker['rejected']} requests failed fast "
+                          f"(now {breaker['state']})", "WARNING")
+        if engine.single_flight:
+            sf = engine.single_flight.stats()
+            if sf['coalesced']:
+                self._add_log(f"Duplicate prompts: {sf['coalesced']} rows shared an in-flight request "
+                              f"({sf['calls']} distinct calls so far)", "INFO")
+        if engine.hedge:
+            h = engine.hedge.stats()
+            self._add_log(f"Hedging: {h['hedged']}/{h['requests']} requests hedged, {h['wins']} won by the duplicate "
+                          f"({h['win_rate']:.0%}), {h['denied']} over budget", "INFO")
+        for line in self.generation_metrics.format_lines():
+            self._add_log(f"Caption timing {line}", "INFO")
+        self.generation_metrics.reset()
+        with self.generated_lock:
+            failed = len(self.failed_cards)
+        if failed:
+            self._add_log(f"{failed} posts have no caption - use \"Retry Failed\" to regenerate only those", "WARNING")
+        if cancelled:
+            self._set_status("Generation stopped")
+            self._add_log(f"Content generation stopped - {cancelled} posts cancelled", "WARNING")
+            return
+        if failed:
+            self._set_status(f"Generation complete, {failed} failed")
+            messagebox.showwarning("Generate", f"{failed} captions failed - use Retry Failed")
+            return
         self._set_status("Generation complete")
         self._add_log("All content generation completed successfully", "SUCCESS")
         messagebox.showinfo("Generate", "All captions generated")
@@ -497,28 +787,97 @@ class SocialMediaGeneratorV4:
             return
         self._add_log(f"Starting generation for post {idx+1}", "INFO")
         self.progress.start()
-        threading.Thread(target=lambda: self._generate_single_worker(idx), daemon=True).start()
+        card = self.cards[idx]
+        start = time.perf_counter()
+        first_token = []
+        show = self._caption_streamer(card)
 
-    def _generate_single_worker(self, idx):
-        self._generate_for_card(self.cards[idx])
-        self.root.after(0, self.progress.stop)
+        def on_chunk(text):
+            if not first_token:
+                first_token.append(time.perf_counter() - start)
+            show(text)
+        # Generating one card on request always asks Gemini for a fresh caption, streamed into the card.
+        # It runs at interactive priority, ahead of any queued bulk generation
+        queue = self.generation_engine.format_queue_depth()
+        if queue != "idle":
+            self._add_log(f"Post {idx+1} jumps the generation queue ({queue})", "INFO")
+        future = self.generation_engine.submit(build_caption_prompt(card.data), force_refresh=True, on_chunk=on_chunk,
+                                               priority=PRIORITY_INTERACTIVE)
+        future.add_done_callback(
+            lambda f: self.root.after(0, lambda: self._generate_single_done(card, f, start, first_token)))
+
+    def _generate_single_done(self, card, future, start, first_token):
+        idx = card.index
+        timing = f"{time.perf_counter() - start:.2f}s" + (f", first token {first_token[0]:.2f}s" if first_token else "")
+        for card, caption in self._caption_results([card], future, timing):
+            self._finish_card(card, caption)
+        self._save_caption_ledger()
+        self.progress.stop()
         self._set_status(f"Post {idx+1} generated")
         self._add_log(f"Content generation completed for post {idx+1}", "SUCCESS")
 
-    def _generate_for_card(self, card):
-        data = card.data
-        idx = card.index
+    def _caption_results(self, cards, future, timing=None):
+        """(card, caption) pairs from a finished engine future; failed rows get a 'Generation failed' caption."""
         try:
-            model = genai.GenerativeModel('gemini-2.0-flash-exp') if genai else None
-            if not model:
-                raise RuntimeError("Gemini SDK missing")
-            prompt = f"""You are a social media copywriter. Create ONE engaging caption.\nBrand: {data.get('brand_name','')}\nPlatform: {data.get('platform_type','Instagram')}\nTheme: {data.get('content','')}\nContext: {data.get('prompt','')}\nPhone: {data.get('phone_number','')} Email: {data.get('email_id','')}\nRules: Hook first line, <=150 words, 5-8 relevant hashtags end, CTA, premium tone.\nReturn only caption."""
-            resp = model.generate_content(prompt)
-            caption = (resp.text or '').strip() if resp else 'Generation failed'
-            self._add_log(f"Caption generated for post {idx+1} (Brand: {data.get('brand_name', 'Unknown')})", "SUCCESS")
+            result = future.result()
+            results = result if isinstance(result, dict) else {str(cards[0].index): result}
+        except CancelledError:
+            results = {str(card.index): RuntimeError("cancelled") for card in cards}
         except Exception as e:
-            caption = f"Generation failed: {e}"[:500]
-            self._add_log(f"Caption generation failed for post {idx+1}: {e}", "ERROR")
+            results = {str(card.index): e for card in cards}
+        pairs = []
+        for card in cards:
+            idx = card.index
+            caption = results.get(str(idx), RuntimeError("no caption returned"))
+            with self.generated_lock:
+                if isinstance(caption, Exception):
+                    self.failed_cards[idx] = card
+                else:
+                    self.failed_cards.pop(idx, None)
+            if self.caption_ledger:
+                ok = not isinstance(caption, Exception)
+                self.caption_ledger.record(card.fingerprint, caption if ok else None, ok, self.gemini_client.model_name)
+            if isinstance(caption, Exception):
+                self._add_log(f"Caption generation failed for post {idx+1}: {caption}", "ERROR")
+                caption = f"Generation failed: {caption}"[:500]
+            else:
+                self._add_log(f"Caption generated for post {idx+1} (Brand: {card.data.get('brand_name', 'Unknown')})"
+                              + (f" in {timing}" if timing else ""), "SUCCESS")
+            pairs.append((card, caption))
+        return pairs
+
+    def _save_caption_ledger(self):
+        if not self.caption_ledger:
+            return
+        try:
+            self.caption_ledger.save()
+        except OSError as e:
+            self._add_log(f"Could not save captions next to the sheet: {e}", "WARNING")
+
+    def _caption_streamer(self, card):
+        """on_chunk callback that shows the growing caption, with at most one UI update queued at a time."""
+        lock = threading.Lock()
+        state = {'text': '', 'pending': False}
+
+        def flush():
+            with lock:
+                text = state['text']
+                state['pending'] = False
+            self._set_caption(card, text)
+
+        def on_chunk(text):
+            with lock:
+                state['text'] = text
+                if state['pending']:
+                    return
+                state['pending'] = True
+            self.root.after(0, flush)
+        return on_chunk
+
+    def _finish_card(self, card, caption):
+        """Show the caption, build the placeholder image and store the export record for one card."""
+        data = card.data
+        idx = card.index
         self.root.after(0, lambda c=caption: self._set_caption(card, c))
         # Placeholder image creation
         try:
@@ -531,9 +890,10 @@ class SocialMediaGeneratorV4:
             self._add_log(f"Image creation failed for post {idx+1}: {e}", "WARNING")
         # Store export record
         entry = { **data.to_dict(), 'generated_caption': caption, 'generated_image_path': getattr(card, 'generated_image_path', None), 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S') }
-        if len(self.generated_data) <= idx:
-            self.generated_data.extend([None] * (idx + 1 - len(self.generated_data)))
-        self.generated_data[idx] = entry
+        with self.generated_lock:
+            if len(self.generated_data) <= idx:
+                self.generated_data.extend([None] * (idx + 1 - len(self.generated_data)))
+            self.generated_data[idx] = entry
 
     def _set_caption(self, card, caption):
         if hasattr(card, 'caption_widget'):
@@ -574,7 +934,7 @@ class SocialMediaGeneratorV4:
 
     # INSTAGRAM LOGIN
     def _login_instagram(self):
-        if not self.uploader or not self.uploader.driver:
+        if not self.uploader or not self.uploader.available():
             messagebox.showerror("Upload", "Browser not available")
             self._add_log("Instagram login failed - Browser not available", "ERROR")
             return
@@ -590,6 +950,7 @@ class SocialMediaGeneratorV4:
     def _do_login(self, u, p):
         ok = self.uploader.login(u, p)
         if ok:
+            self.gui_account = u
             self._set_status("Logged in")
             self._add_log(f"Successfully logged into Instagram as {u}", "SUCCESS")
         else:
@@ -599,7 +960,7 @@ class SocialMediaGeneratorV4:
     # UPLOAD SINGLE
     def _upload_single(self, idx):
         if idx >= len(self.cards): return
-        if not self.uploader or not self.uploader.driver:
+        if not self.uploader or not self.uploader.available():
             messagebox.showerror("Upload", "Browser not ready / login first")
             self._add_log(f"Upload failed for post {idx+1} - Browser not ready", "ERROR")
             return
@@ -636,57 +997,90 @@ class SocialMediaGeneratorV4:
             messagebox.showwarning("Upload", "No posts")
             self._add_log("Batch upload failed - No posts available", "WARNING")
             return
-        if not self.uploader or not self.uploader.driver:
+        if not self.uploader or not self.uploader.available():
             messagebox.showerror("Upload", "Browser not ready / login first")
             self._add_log("Batch upload failed - Browser not ready", "ERROR")
             return
-        self.uploader.reset_stop()
+        self.pool.reset_stop()
         if self.upload_thread and self.upload_thread.is_alive():
             messagebox.showinfo("Upload", "Upload already running")
             self._add_log("Batch upload skipped - Already in progress", "INFO")
             return
+        try:
+            self.pool.size = max(1, int(self.pool_size_var.get()))
+        except (tk.TclError, ValueError):
+            self.pool.size = 1
+        gui_account = (self.user_entry.get().strip(), self.pass_entry.get().strip())
         self._add_log(f"Starting batch upload for {len(self.cards)} posts", "INFO")
         self.progress.start()
-        self.upload_thread = threading.Thread(target=self._upload_all_worker, daemon=True)
+        self.upload_thread = threading.Thread(target=lambda: self._upload_all_worker(gui_account), daemon=True)
         self.upload_thread.start()
 
-    def _upload_all_worker(self):
-        uploaded_count = 0
-        skipped_count = 0
-        
+    def _group_cards_by_account(self, default_account=None):
+        """Group cards by their account column, keeping row order within each account."""
+        groups = {}
         for card in self.cards:
-            if self.uploader.stop_event.is_set():
-                self._add_log("Batch upload stopped by user", "WARNING")
-                break
-                
-            caption = card.caption_widget.get('1.0', tk.END).strip()
-            if not caption:
-                self._add_log(f"Skipping post {card.index+1} - No caption", "WARNING")
-                skipped_count += 1
-                continue
-                
-            img_path = card.generated_image_path
-            if not img_path or not os.path.exists(img_path):
-                self._add_log(f"Skipping post {card.index+1} - No image", "WARNING")
-                skipped_count += 1
-                continue
-                
-            success, msg = self.uploader.upload_post(img_path, caption)
-            if success:
-                uploaded_count += 1
-                self._add_log(f"Post {card.index+1} uploaded successfully", "SUCCESS")
-            else:
-                self._add_log(f"Post {card.index+1} failed: {msg}", "ERROR")
-            
-            # Brief delay between posts
-            for _ in range(5):
-                if self.uploader.stop_event.is_set():
-                    break
-                time.sleep(1)
-            if self.uploader.stop_event.is_set():
+            groups.setdefault(self._card_account(card, default_account), []).append(card)
+        return groups
+
+    @staticmethod
+    def _card_value(card, column):
+        """Stripped cell text; blank cells (NaN in pandas) give ''."""
+        value = str(card.data.get(column, '') or '').strip()
+        return '' if value.lower() == 'nan' else value
+
+    @classmethod
+    def _card_account(cls, card, default_account=None):
+        return cls._card_value(card, ACCOUNT_COLUMN) or default_account
+
+    def _login_for_account(self, uploader, account, cards, gui_account):
+        """Make sure uploader is logged in as account; the password comes from the rows or the GUI."""
+        if not account or uploader.account == account:
+            return True
+        password = next((p for p in (self._card_value(c, ACCOUNT_PASSWORD_COLUMN) for c in cards) if p), '')
+        if not password and account == gui_account[0]:
+            password = gui_account[1]
+        return uploader.login(account, password)
+
+    def _default_account(self, gui_account):
+        """Account for rows without one: the GUI login, else the username typed in the GUI."""
+        return self.gui_account or gui_account[0] or None
+
+    def _restore_gui_login(self, gui_account):
+        """Log the primary browser back into the GUI account if a batch had to switch it."""
+        account = self._default_account(gui_account)
+        if not account or self.uploader.account in (None, account):
+            return
+        self._add_log(f"Logging the main browser back into {account}", "INFO")
+        password = gui_account[1] if account == gui_account[0] else ''
+        if not self.uploader.login(account, password):
+            self._add_log(f"Could not log back into {account} - log in again before uploading", "WARNING")
+
+    def _pause_between_posts(self, uploader, seconds=5):
+        """Brief delay between posts; returns True if a stop was requested meanwhile."""
+        for _ in range(seconds):
+            if uploader.stop_event.is_set():
                 break
+            time.sleep(1)
+        return uploader.stop_event.is_set()
+
+    def _upload_all_worker(self, gui_account=(None, None)):
+        counts = {'uploaded': 0, 'skipped': 0}
+        counts_lock = threading.Lock()
+        self.uploader.wait_until_ready()
+        # Rows without an account go to the account logged in through the GUI
+        groups = self._group_cards_by_account(self._default_account(gui_account))
+        if len(groups) > 1:
+            self._add_log(f"Uploading for {len(groups)} accounts with up to {self.pool.size} browsers", "INFO")
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.pool.size, len(groups)))) as executor:
+            for account, cards in groups.items():
+                executor.submit(self._upload_account_batch, account, cards, gui_account, counts, counts_lock)
+        self._restore_gui_login(gui_account)
                 
         self.root.after(0, self.progress.stop)
+        uploaded_count, skipped_count = counts['uploaded'], counts['skipped']
+        self._report_upload_metrics()
         
         if self.uploader.stop_event.is_set():
             self._add_log(f"Batch upload stopped - {uploaded_count} uploaded, {skipped_count} skipped", "WARNING")
@@ -694,14 +1088,209 @@ class SocialMediaGeneratorV4:
             self._add_log(f"Batch upload complete - {uploaded_count} uploaded, {skipped_count} skipped", "SUCCESS")
             messagebox.showinfo("Upload", f"Batch upload complete!\nUploaded: {uploaded_count}\nSkipped: {skipped_count}")
 
-    def _stop_uploading(self):
+    def _report_upload_metrics(self):
+        """Log per-step latency percentiles for the batch and write them to metrics/."""
+        lines = self.upload_metrics.format_lines()
+        if not lines:
+            return
+        self._add_log("Upload step timings (p50/p95/p99):", "INFO")
+        for line in lines:
+            self._add_log(line, "INFO")
+        try:
+            path = self.upload_metrics.export('metrics', 'upload_metrics')
+            self._add_log(f"Upload metrics saved to {path}", "INFO")
+        except Exception as e:
+            self._add_log(f"Could not save upload metrics: {e}", "WARNING")
+        self.upload_metrics.reset()
+
+    def _upload_account_batch(self, account, cards, gui_account, counts, counts_lock):
+        """Upload one account's cards in order on a pooled browser."""
+        def count(key, n=1):
+            with counts_lock:
+                counts[key] += n
+        
+        try:
+            uploader = self.pool.acquire(account)
+        except Exception as e:
+            self._add_log(f"Skipping {len(cards)} posts for {account or 'default account'} - {e}", "ERROR")
+            count('skipped', len(cards))
+            return
+        try:
+            if not self._login_for_account(uploader, account, cards, gui_account):
+                self._add_log(f"Skipping {len(cards)} posts - login failed for {account}", "ERROR")
+                count('skipped', len(cards))
+                return
+            
+            for card in cards:
+                if uploader.stop_event.is_set():
+                    self._add_log("Batch upload stopped by user", "WARNING")
+                    break
+                    
+                caption = card.caption_widget.get('1.0', tk.END).strip()
+                if not caption:
+                    self._add_log(f"Skipping post {card.index+1} - No caption", "WARNING")
+                    count('skipped')
+                    continue
+                    
+                img_path = card.generated_image_path
+                if not img_path or not os.path.exists(img_path):
+                    self._add_log(f"Skipping post {card.index+1} - No image", "WARNING")
+                    count('skipped')
+                    continue
+                    
+                success, msg = uploader.upload_post(img_path, caption)
+                if success:
+                    count('uploaded')
+                    self._add_log(f"Post {card.index+1} uploaded successfully" + (f" to {account}" if account else ""), "SUCCESS")
+                else:
+                    self._add_log(f"Post {card.index+1} failed: {msg}", "ERROR")
+                
+                if self._pause_between_posts(uploader):
+                    break
+        finally:
+            self.pool.release(uploader)
+
+    # GENERATE + UPLOAD PIPELINE
+    def _generate_and_upload(self):
+        if not self.gemini_api_key:
+            messagebox.showwarning("Generate", "Set API key first")
+            self._add_log("Pipeline failed - API key not set", "WARNING")
+            return
+        if not self.cards:
+            messagebox.showwarning("Generate", "Load data first")
+            self._add_log("Pipeline failed - No data loaded", "WARNING")
+            return
+        if not self.uploader or not self.uploader.available():
+            messagebox.showerror("Upload", "Browser not ready / login first")
+            self._add_log("Pipeline failed - Browser not ready", "ERROR")
+            return
+        if self.upload_thread and self.upload_thread.is_alive():
+            messagebox.showinfo("Upload", "Upload already running")
+            self._add_log("Pipeline skipped - Upload already in progress", "INFO")
+            return
+        try:
+            workers = max(1, int(self.generation_workers_var.get()))
+        except (tk.TclError, ValueError):
+            workers = 1
+        try:
+            self.pool.size = max(1, int(self.pool_size_var.get()))
+        except (tk.TclError, ValueError):
+            self.pool.size = 1
+        self.pool.reset_stop()
+        force_refresh = self.force_refresh_var.get()
+        gui_account = (self.user_entry.get().strip(), self.pass_entry.get().strip())
+        self._add_log(f"Starting generate + upload pipeline for {len(self.cards)} posts "
+                      f"({workers} generating, {self.pool.size} browsers)", "INFO")
+        self.progress.start()
+        self.generation_engine.set_concurrency(workers)
+        self.upload_thread = threading.Thread(
+            target=lambda: self._pipeline_worker(list(self.cards), workers, force_refresh, gui_account), daemon=True)
+        self.upload_thread.start()
+
+    def _pipeline_worker(self, cards, workers, force_refresh, gui_account):
+        self.uploader.wait_until_ready()
+        default_account = self._default_account(gui_account)
+        model = self.gemini_client.model_name
+        counts = {'uploaded': 0, 'skipped': 0}
+        counts_lock = threading.Lock()
+        # One post at a time per account, in the order captions become ready
+        account_locks = {}
+
+        def count(key):
+            with counts_lock:
+                counts[key] += 1
+
+        def caption_stage(card):
+            if self.caption_ledger and not force_refresh and self.caption_ledger.is_current(card.fingerprint, model):
+                return card, self.caption_ledger.get(card.fingerprint)['caption']
+            future = self.generation_engine.submit(build_caption_prompt(card.data), force_refresh)
+            [(card, caption)] = self._caption_results([card], future)
+            with self.generated_lock:
+                failed = card.index in self.failed_cards
+            if failed:
+                self._finish_card(card, caption)
+                count('skipped')
+                return None
+            return card, caption
+
+        def render_stage(item):
+            card, caption = item
+            self._finish_card(card, caption)
+            if not card.generated_image_path or not os.path.exists(card.generated_image_path):
+                self._add_log(f"Skipping post {card.index+1} - No image", "WARNING")
+                count('skipped')
+                return None
+            return item
+
+        def upload_stage(item):
+            card, caption = item
+            account = self._card_account(card, default_account)
+            with counts_lock:
+                lock = account_locks.setdefault(account, threading.Lock())
+            with lock:
+                uploader = self.pool.acquire(account)
+                try:
+                    if not self._login_for_account(uploader, account, [card], gui_account):
+                        self._add_log(f"Skipping post {card.index+1} - login failed for {account}", "ERROR")
+                        count('skipped')
+                        return None
+                    success, msg = uploader.upload_post(card.generated_image_path, caption)
+                    if success:
+                        count('uploaded')
+                        self._add_log(f"Post {card.index+1} uploaded successfully" + (f" to {account}" if account else ""), "SUCCESS")
+                    else:
+                        self._add_log(f"Post {card.index+1} failed: {msg}", "ERROR")
+                    self._set_status(f"Uploaded {counts['uploaded']}/{len(cards)}")
+                    if self._pause_between_posts(uploader):
+                        self.pipeline.stop()
+                finally:
+                    self.pool.release(uploader)
+            return card
+
+        def on_error(stage, item, exc):
+            count('skipped')
+            self._add_log(f"Pipeline {stage} step failed: {exc}", "ERROR")
+
+        self.pipeline = Pipeline([
+            Stage('caption', caption_stage, workers=workers, queue_size=workers),
+            Stage('render', render_stage, workers=2, queue_size=4),
+            # Small queue in front of the browsers: when uploads fall behind, generation waits
+            Stage('upload', upload_stage, workers=self.pool.size, queue_size=self.pool.size),
+        ], on_error=on_error)
+        stats = self.pipeline.run(cards)
+        stopped = self.pipeline.stopped
+        self._restore_gui_login(gui_account)
+        self.root.after(0, self.progress.stop)
+        self._save_caption_ledger()
+        for stage, s in stats.items():
+            self._add_log(f"Pipeline {stage}: {s['processed']} items, busy {s['busy']:.1f}s, "
+                          f"waiting on next stage {s['blocked']:.1f}s", "INFO")
+        self._report_upload_metrics()
+        uploaded_count, skipped_count = counts['uploaded'], counts['skipped']
+        if stopped:
+            self._add_log(f"Pipeline stopped - {uploaded_count} uploaded, {skipped_count} skipped", "WARNING")
+        else:
+            self._add_log(f"Pipeline complete - {uploaded_count} uploaded, {skipped_count} skipped", "SUCCESS")
+            messagebox.showinfo("Upload", f"Generate + upload complete!\nUploaded: {uploaded_count}\nSkipped: {skipped_count}")
+
+    def _stop(self):
+        if self.pipeline:
+            self.pipeline.stop()
+        if self.generation_engine and self.generation_engine.pending():
+            self.generation_engine.cancel_all()
+            self._add_log("Generation stop requested", "INFO")
         if self.uploader:
-            self.uploader.stop()
+            self.pool.stop()
             self._add_log("Upload stop requested", "INFO")
 
     # CLEANUP
     def _on_close(self):
         try:
+            if self.generation_engine:
+                self.generation_engine.close()
+            if self.semantic_cache:
+                self.semantic_cache.close()
+            self.pool.close()
             if self.uploader:
                 self.uploader.close()
         except Exception:
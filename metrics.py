@@ -0,0 +1,118 @@
+import csv
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the histogram buckets written to metrics files
+BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 30, 60, math.inf)
+
+
+class LatencyHistogram:
+    """Latency samples for one step, with percentile and bucket summaries."""
+
+    def __init__(self):
+        self.samples = []
+        self.errors = 0
+
+    def add(self, seconds, ok=True):
+        self.samples.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, p):
+        """Linearly interpolated percentile, p in [0, 100]."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = (len(ordered) - 1) * p / 100
+        lo, hi = math.floor(rank), math.ceil(rank)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+    def buckets(self):
+        counts = []
+        for bound in BUCKETS:
+            counts.append(sum(1 for s in self.samples if s <= bound))
+        return {('+Inf' if math.isinf(b) else str(b)): c for b, c in zip(BUCKETS, counts)}
+
+    def summary(self):
+        count = len(self.samples)
+        return {
+            'count': count,
+            'errors': self.errors,
+            'mean': sum(self.samples) / count if count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': max(self.samples) if count else 0.0,
+        }
+
+
+class StepMetrics:
+    """
+    Thread-safe collection of per-step latency histograms.
+
+    Wrap each step in span(); a step that raises is still timed and counted
+    as an error.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, step):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(step, time.perf_counter() - start, ok)
+
+    def record(self, step, seconds, ok=True):
+        with self._lock:
+            self._histograms.setdefault(step, LatencyHistogram()).add(seconds, ok)
+
+    def summary(self):
+        """{step: {'count', 'errors', 'mean', 'p50', 'p95', 'p99', 'max'}} in first-seen order."""
+        with self._lock:
+            return {step: h.summary() for step, h in self._histograms.items()}
+
+    def format_lines(self):
+        """Human-readable lines for the activity log."""
+        return [
+            f"{step}: n={s['count']} p50={s['p50']:.2f}s p95={s['p95']:.2f}s p99={s['p99']:.2f}s max={s['max']:.2f}s"
+            + (f" errors={s['errors']}" if s['errors'] else "")
+            for step, s in self.summary().items()
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def write_json(self, path):
+        with self._lock:
+            data = {step: {**h.summary(), 'buckets': h.buckets()} for step, h in self._histograms.items()}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+    def write_csv(self, path):
+        fields = ['step', 'count', 'errors', 'mean', 'p50', 'p95', 'p99', 'max']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for step, s in self.summary().items():
+                writer.writerow({'step': step, **{k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()}})
+
+    def export(self, folder, prefix):
+        """Write <prefix>_<timestamp>.json and .csv into folder; returns the JSON path."""
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        base = os.path.join(folder, f"{prefix}_{stamp}")
+        self.write_json(base + '.json')
+        self.write_csv(base + '.csv')
+        return base + '.json'
@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+
+# Marks the end of the input on a stage's queue
+_DONE = object()
+
+
+class Stage:
+    """One pipeline step: func(item) -> next item, or None to drop the item."""
+
+    def __init__(self, name, func, workers=1, queue_size=4):
+        """
+        Args:
+            name (str): Used in stats and error reports
+            func (callable): Called on the stage's own worker threads
+            workers (int): Threads serving this stage
+            queue_size (int): Capacity of the queue feeding this stage
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues, each served by its own threads.
+
+    Items flow through every stage in order, so the first item can reach the
+    last stage while later ones are still in the first. A full queue blocks
+    the stage in front of it: a slow consumer throttles everything upstream
+    instead of letting finished work pile up.
+    """
+
+    def __init__(self, stages, on_error=None):
+        """
+        Args:
+            stages (list): Stage objects, first to last
+            on_error (callable): on_error(stage_name, item, exc) when a stage raises; the item is dropped
+        """
+        self.stages = list(stages)
+        self.on_error = on_error
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._remaining = [stage.workers for stage in self.stages]
+        self._stats = {stage.name: {'processed': 0, 'dropped': 0, 'errors': 0, 'busy': 0.0, 'blocked': 0.0}
+                       for stage in self.stages}
+
+    def stop(self):
+        """Stop taking new work; items already queued are drained without being processed."""
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def run(self, items):
+        """Push items through every stage; blocks until the last stage has finished."""
+        threads = []
+        for i, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(i,), name=f"pipeline-{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+        for item in items:
+            if self._stop.is_set():
+                break
+            self._queues[0].put(item)
+        for _ in range(self.stages[0].workers):
+            self._queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        return self.stats()
+
+    def stats(self):
+        """{stage: {'processed', 'dropped', 'errors', 'busy', 'blocked'}}; times in seconds."""
+        with self._lock:
+            return {name: dict(s) for name, s in self._stats.items()}
+
+    def _work(self, i):
+        stage = self.stages[i]
+        inbox = self._queues[i]
+        outbox = self._queues[i + 1] if i + 1 < len(self.stages) else None
+        stats = self._stats[stage.name]
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if self._stop.is_set():
+                continue
+            start = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                result = None
+                with self._lock:
+                    stats['errors'] += 1
+                if self.on_error:
+                    self.on_error(stage.name, item, e)
+            with self._lock:
+                stats['busy'] += time.perf_counter() - start
+                stats['processed'] += 1
+                if result is None:
+                    stats['dropped'] += 1
+            if result is not None and outbox is not None:
+                start = time.perf_counter()
+                outbox.put(result)
+                with self._lock:
+                    stats['blocked'] += time.perf_counter() - start
+        # The last worker of a stage to finish passes the end marker on
+        with self._lock:
+            self._remaining[i] -= 1
+            last = self._remaining[i] == 0
+        if last and outbox is not None:
+            for _ in range(self.stages[i + 1].workers):
+                outbox.put(_DONE)
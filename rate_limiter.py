@@ -0,0 +1,182 @@
+import asyncio
+import re
+import threading
+import time
+from collections import Counter
+
+
+def is_rate_limit_error(exc):
+    """True for quota / HTTP 429 errors from the Gemini SDK or its transport."""
+    name = type(exc).__name__
+    if name in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    if getattr(exc, 'code', None) == 429:
+        return True
+    text = str(exc).lower()
+    return bool(re.search(r'\b429\b', text)) or 'quota' in text or 'rate limit' in text
+
+
+def retry_after_hint(exc):
+    """Seconds the API asked us to wait, if the error carries a hint."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('Retry-After') or headers.get('retry-after')
+        if value:
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+    # google.api_core errors carry a google.rpc.RetryInfo in details
+    for detail in getattr(exc, 'details', None) or ():
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None and hasattr(delay, 'seconds'):
+            return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+    text = str(exc)
+    # e.g. "retry_delay {\n  seconds: 44\n}" or "Please retry in 12.5s"
+    match = (re.search(r'retry_delay\s*\{[^}]*?seconds:\s*(\d+)', text, re.IGNORECASE)
+             or re.search(r'retry(?: after| in)?\s+(\d+(?:\.\d+)?)\s*s(?:ec(?:ond)?s?)?\b', text, re.IGNORECASE))
+    return float(match.group(1)) if match else None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token buckets for requests-per-minute and tokens-per-minute shared by all generation workers.
+
+    acquire_async() waits until a request fits both budgets. On a quota error the
+    request rate is cut (and every worker pauses for any retry-after hint);
+    after a quiet period without errors it is raised again step by step, up
+    to the configured ceiling. While a more urgent caller (lower priority
+    number) is waiting, less urgent ones leave the budget to it.
+    """
+
+    def __init__(self, requests_per_minute=15, tokens_per_minute=1_000_000, burst_seconds=4,
+                 backoff_factor=0.5, recovery_factor=1.2, probe_interval=20, min_requests_per_minute=1):
+        """
+        Args:
+            requests_per_minute (float): Request quota ceiling
+            tokens_per_minute (float): Token quota ceiling (input + output)
+            burst_seconds (float): How many seconds of budget may be spent at once
+            backoff_factor (float): Rate multiplier applied on a quota error
+            recovery_factor (float): Rate multiplier applied on each successful probe
+            probe_interval (float): Seconds without errors before probing a higher rate
+            min_requests_per_minute (float): Floor for the adaptive rate
+        """
+        self.max_rpm = float(requests_per_minute)
+        self.tpm = float(tokens_per_minute)
+        self.rpm = self.max_rpm
+        self.burst_seconds = burst_seconds
+        self.backoff_factor = backoff_factor
+        self.recovery_factor = recovery_factor
+        self.probe_interval = probe_interval
+        self.min_rpm = min_requests_per_minute
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._request_tokens = self._request_capacity()
+        self._token_tokens = self._token_capacity()
+        self._refilled = now
+        self._paused_until = 0.0
+        self._last_change = now
+        self._waiting = Counter()
+        self.rate_limited = 0
+        self.waited = 0.0
+
+    def _request_capacity(self):
+        return max(1.0, self.rpm * self.burst_seconds / 60)
+
+    def _token_capacity(self):
+        return max(1.0, self.tpm * self.burst_seconds / 60)
+
+    def _refill(self, now):
+        elapsed = now - self._refilled
+        self._refilled = now
+        self._request_tokens = min(self._request_capacity(), self._request_tokens + elapsed * self.rpm / 60)
+        self._token_tokens = min(self._token_capacity(), self._token_tokens + elapsed * self.tpm / 60)
+
+    async def acquire_async(self, tokens=0, priority=0):
+        """
+        Wait, without blocking the event loop, until one request costing tokens fits the budgets.
+
+        Args:
+            tokens (int): Estimated token cost
+            priority (int): Lower is more urgent
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        start = time.monotonic()
+        self._enter(priority)
+        try:
+            while True:
+                waited, delay = self._try_acquire(tokens, start, priority)
+                if waited is not None:
+                    return waited
+                await asyncio.sleep(min(delay, 1.0))
+        finally:
+            self._leave(priority)
+
+    def _enter(self, priority):
+        with self._lock:
+            self._waiting[priority] += 1
+
+    def _leave(self, priority):
+        with self._lock:
+            self._waiting[priority] -= 1
+            if not self._waiting[priority]:
+                del self._waiting[priority]
+
+    def _try_acquire(self, tokens, start, priority=0):
+        """(seconds waited, None) if the request was admitted, else (None, seconds to wait)."""
+        with self._lock:
+            if any(p < priority for p in self._waiting):
+                return None, 0.05
+            now = time.monotonic()
+            self._refill(now)
+            # A single request larger than the burst must still get through eventually
+            tokens_needed = min(tokens, self._token_capacity())
+            if now >= self._paused_until and self._request_tokens >= 1 and self._token_tokens >= tokens_needed:
+                self._request_tokens -= 1
+                self._token_tokens -= tokens_needed
+                waited = now - start
+                self.waited += waited
+                return waited, None
+            return None, max(
+                self._paused_until - now,
+                (1 - self._request_tokens) * 60 / self.rpm,
+                (tokens_needed - self._token_tokens) * 60 / self.tpm,
+                0.01,
+            )
+
+    def record_tokens(self, estimated, actual):
+        """Correct the token bucket once the real usage of a request is known."""
+        if actual is None:
+            return
+        with self._lock:
+            self._token_tokens -= actual - estimated
+
+    def on_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.rpm < self.max_rpm and now - self._last_change >= self.probe_interval:
+                self.rpm = min(self.max_rpm, self.rpm * self.recovery_factor)
+                self._last_change = now
+
+    def on_rate_limited(self, retry_after=None):
+        """Cut the request rate and, if the API gave a hint, pause every worker that long."""
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited += 1
+            self.rpm = max(self.min_rpm, self.rpm * self.backoff_factor)
+            self._request_tokens = min(self._request_tokens, 0.0)
+            self._last_change = now
+            pause = retry_after if retry_after is not None else 60 / self.rpm
+            self._paused_until = max(self._paused_until, now + pause)
+
+    def stats(self):
+        with self._lock:
+            return {'requests_per_minute': round(self.rpm, 2), 'rate_limited': self.rate_limited,
+                    'waited_seconds': round(self.waited, 2)}
+
+
+def estimate_tokens(prompt, max_output_tokens=512):
+    """Rough token cost of a request: about four characters per token plus the output budget."""
+    return len(str(prompt)) // 4 + max_output_tokens
@@ -0,0 +1,195 @@
+import math
+import random
+import threading
+import time
+from collections import deque
+
+from rate_limiter import is_rate_limit_error
+
+# google.api_core exception names for server-side and transport failures
+TRANSIENT_ERROR_NAMES = (
+    'DeadlineExceeded', 'ServiceUnavailable', 'InternalServerError', 'GatewayTimeout',
+    'BadGateway', 'Aborted', 'Unknown', 'RetryError',
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+def is_transient_error(exc):
+    """True for failures that say nothing about the request itself: timeouts, 5xx, dropped connections, quota."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    code = getattr(exc, 'code', None)
+    if isinstance(code, int) and 500 <= code < 600:
+        return True
+    return is_rate_limit_error(exc)
+
+
+class RetryPolicy:
+    """Per-attempt timeout plus exponential backoff with full jitter for transient errors."""
+
+    def __init__(self, max_attempts=3, timeout=60, base_delay=1.0, max_delay=30.0):
+        """
+        Args:
+            max_attempts (int): Attempts per request, including the first
+            timeout (float): Seconds one attempt may take (None for no limit)
+            base_delay (float): Backoff before the second attempt, doubled after each failure
+            max_delay (float): Upper bound for a single backoff
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, exc, attempt):
+        # Quota errors were already retried (and paced) by the client
+        return attempt < self.max_attempts and is_transient_error(exc) and not is_rate_limit_error(exc)
+
+    def backoff(self, attempt):
+        """Seconds to wait after the given failed attempt (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling the API after repeated transient failures.
+
+    After failure_threshold consecutive failures the breaker opens and every
+    call fails fast with CircuitOpenError. Once reset_timeout has passed one
+    call is let through as a probe: success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return 'open'
+            return 'half-open'
+
+    def check(self):
+        """
+        Raise CircuitOpenError if calls are currently refused.
+
+        Returns True when the caller is the half-open probe; it must then report
+        record_success(), record_failure() or release_probe().
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if self._probing or remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(f"Gemini API unavailable, calls paused for {max(remaining, 0):.0f}s")
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        """Give up a probe that ended without a verdict (cancelled, or a quota error) so another call can probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if self._opened_at is None:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return {'state': state, 'opened': self.opened, 'rejected': self.rejected}
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate of a slow request, and how many duplicates are allowed.
+
+    A request still running after the recent p95 latency gets a second copy,
+    sent to `client` (e.g. a flash model) or, when that is None, to the same
+    model. Duplicates are capped at `budget` times the number of requests.
+    """
+
+    def __init__(self, client=None, budget=0.1, percentile=95, min_samples=20, min_delay=2.0, window=200):
+        """
+        Args:
+            client (GeminiClient): Fallback client for the duplicate (None: same client)
+            budget (float): Extra requests allowed per request, e.g. 0.1 for 10%
+            percentile (float): Latency percentile after which a request is hedged
+            min_samples (int): Latencies to observe before hedging starts
+            min_delay (float): Never hedge earlier than this many seconds
+            window (int): Recent latencies the percentile is computed over
+        """
+        self.client = client
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+        self.denied = 0
+
+    def observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self):
+        """Seconds to wait before hedging, or None while there is too little history."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        rank = max(0, math.ceil(len(ordered) * self.percentile / 100) - 1)
+        return max(self.min_delay, ordered[rank])
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_hedge(self):
+        """Take one duplicate from the budget; False when it is spent."""
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.requests:
+                self.denied += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def stats(self):
+        delay = self.delay()
+        with self._lock:
+            return {'requests': self.requests, 'hedged': self.hedged, 'wins': self.wins,
+                    'win_rate': self.wins / self.hedged if self.hedged else 0.0, 'denied': self.denied,
+                    'delay': round(delay, 2) if delay is not None else None}
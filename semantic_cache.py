@@ -0,0 +1,137 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from caption_cache import normalize_prompt
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_DIM = 1024
+
+
+def hashed_embedding(text, dim=DEFAULT_DIM):
+    """
+    Unit vector of signed, hashed character trigrams of the normalized prompt.
+
+    Local and deterministic: prompts that differ only in punctuation, spacing
+    or a few characters (a phone number, a date) land close together.
+    """
+    text = re.sub(r'[^\w\s]', '', normalize_prompt(text).lower())
+    vec = np.zeros(dim, dtype=np.float32)
+    for i in range(len(text) - 2):
+        h = zlib.crc32(text[i:i + 3].encode('utf-8'))
+        vec[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def _scope_hash(scope):
+    # Never 0, which marks matrix rows without an entry
+    return zlib.crc32(str(scope).encode('utf-8')) + 1
+
+
+class SemanticCache:
+    """
+    Near-duplicate prompt cache: reuse a caption whose prompt is similar enough.
+
+    Embeddings live in a memory-mapped float32 matrix on disk (one directory
+    per model) and a lookup is a single matrix-vector product over all rows.
+    Responses are kept in SQLite, keyed by their row in the matrix. Only rows
+    stored under the same scope (e.g. brand and platform) are compared, so
+    text shared by every prompt cannot make two brands look alike.
+    """
+
+    def __init__(self, model_name, root=os.path.join('cache', 'semantic'), threshold=0.97, embed=None,
+                 dim=DEFAULT_DIM, initial_capacity=1024):
+        """
+        Args:
+            model_name (str): Captions are only reused for the same model
+            root (str): Parent directory of the per-model index
+            threshold (float): Minimum cosine similarity for a hit (see SIMILAR_THRESHOLDS in main.py)
+            embed (callable): text -> 1-D vector; defaults to hashed_embedding
+            dim (int): Embedding size (must match embed)
+            initial_capacity (int): Rows allocated in a new matrix; it doubles when full
+        """
+        if np is None:
+            raise RuntimeError("numpy not installed")
+        self.threshold = threshold
+        self.dim = dim
+        self.embed = embed or (lambda text: hashed_embedding(text, dim))
+        self.path = os.path.join(root, re.sub(r'[^A-Za-z0-9_.-]', '_', model_name))
+        os.makedirs(self.path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.path, 'entries.sqlite3'), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, scope TEXT, response TEXT, created REAL)")
+        self._count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self._vectors_path = os.path.join(self.path, 'vectors.f32')
+        existing = os.path.getsize(self._vectors_path) // (4 * dim) if os.path.exists(self._vectors_path) else 0
+        self._open(max(existing, initial_capacity, self._count))
+        # Scope hash per matrix row (0: no entry), to mask out other scopes in a lookup
+        self._scopes = np.zeros(self._vectors.shape[0], dtype=np.int64)
+        for row_id, scope in self._db.execute("SELECT id, scope FROM entries"):
+            if row_id < len(self._scopes):
+                self._scopes[row_id] = _scope_hash(scope)
+
+    def _open(self, capacity):
+        """(Re)map the matrix file with room for capacity rows, growing the file if needed."""
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def get(self, text, scope=''):
+        """Cached response for the most similar earlier text in the same scope, or None below the threshold."""
+        query = np.asarray(self.embed(text), dtype=np.float32)
+        with self._lock:
+            if not self._count:
+                self.misses += 1
+                return None
+            scores = self._vectors[:self._count] @ query
+            scores[self._scopes[:self._count] != _scope_hash(scope)] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            row = self._db.execute("SELECT response FROM entries WHERE id = ? AND scope = ?", (best, scope)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, text, response, scope=''):
+        if not response:
+            return
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        with self._lock, self._db:
+            if self._count >= self._vectors.shape[0]:
+                self._vectors.flush()
+                self._open(self._vectors.shape[0] * 2)
+                self._scopes = np.concatenate([self._scopes, np.zeros(self._vectors.shape[0] - len(self._scopes),
+                                                                      dtype=np.int64)])
+            # Vector first: a row without an entry is simply overwritten by the next put
+            self._vectors[self._count] = vector
+            self._scopes[self._count] = _scope_hash(scope)
+            self._db.execute("INSERT OR REPLACE INTO entries (id, response, created, scope) VALUES (?, ?, ?, ?)",
+                             (self._count, response, time.time(), scope))
+            self._count += 1
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': self._count}
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._db.close()
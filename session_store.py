@@ -0,0 +1,98 @@
+import json
+import os
+import re
+import time
+
+from waits import NEW_POST_BUTTON, element_present, cookie_present, any_of
+
+INSTAGRAM_URL = "https://www.instagram.com/"
+LOGIN_FIELD = "//input[@name='username']"
+
+
+class SessionStore:
+    """
+    Persists Instagram session cookies per username so a restart can skip the login form.
+
+    Cookies are kept as JSON files under root, one per account. They are as
+    sensitive as the password itself, so keep the directory out of version control.
+    """
+
+    def __init__(self, root="sessions"):
+        self.root = root
+
+    def _path(self, username):
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', username.strip().lower())
+        return os.path.join(self.root, f"{safe}.json")
+
+    def load(self, username):
+        """Return the saved cookies for username, or an empty list."""
+        try:
+            with open(self._path(username), 'r', encoding='utf-8') as f:
+                return json.load(f).get('cookies', [])
+        except (OSError, ValueError):
+            return []
+
+    def save(self, driver, username):
+        """Store the driver's current cookies for username."""
+        os.makedirs(self.root, exist_ok=True)
+        record = {'username': username, 'saved_at': time.time(), 'cookies': driver.get_cookies()}
+        tmp = self._path(username) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp, self._path(username))
+
+    def clear(self, username):
+        try:
+            os.remove(self._path(username))
+        except OSError:
+            pass
+
+    def has_session(self, username):
+        """Cheap local check: a sessionid cookie exists and has not expired."""
+        now = time.time()
+        for cookie in self.load(username):
+            if cookie.get('name') == 'sessionid':
+                return cookie.get('expiry', now + 1) > now
+        return False
+
+    def restore(self, driver, username, url=INSTAGRAM_URL):
+        """
+        Load saved cookies into the browser and reload the page.
+
+        Returns:
+            bool: True if cookies were applied (the session may still be rejected)
+        """
+        if not self.has_session(username):
+            return False
+        # Cookies can only be set for the domain currently loaded
+        driver.get(url)
+        driver.delete_all_cookies()
+        for cookie in self.load(username):
+            cookie = {k: v for k, v in cookie.items() if k in ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')}
+            if cookie.get('sameSite') not in (None, 'Strict', 'Lax', 'None'):
+                cookie.pop('sameSite')
+            try:
+                driver.add_cookie(cookie)
+            except Exception:
+                pass  # Cookies for other subdomains are not needed
+        driver.get(url)
+        return True
+
+
+def session_active(waiter, timeout=10):
+    """True if the loaded page is the logged-in home page rather than the login form."""
+    found = waiter.until("session_check", any_of(
+        element_present(NEW_POST_BUTTON), element_present(LOGIN_FIELD)
+    ), timeout=timeout, raise_on_timeout=False)
+    return bool(found) and found.get_attribute("name") != "username"
+
+
+def login_succeeded(waiter, timeout=30):
+    """
+    True once a submitted login is accepted: the home page shows New post or
+    Instagram has set a sessionid cookie. Neither happens on a rejected login
+    or a checkpoint page, so those time out and return False.
+    """
+    return bool(waiter.until("login_result", any_of(
+        element_present(NEW_POST_BUTTON), cookie_present('sessionid')
+    ), timeout=timeout, raise_on_timeout=False))
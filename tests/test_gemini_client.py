@@ -0,0 +1,42 @@
+import json
+
+from gemini_client import build_caption_prompt, parse_batch_response
+
+
+def test_parse_batch_response_keeps_requested_rows():
+    text = json.dumps([
+        {'row_id': 'a', 'caption': ' First '},
+        {'row_id': 'b', 'caption': 'Second'},
+        {'row_id': 'x', 'caption': 'Not requested'},
+    ])
+    assert parse_batch_response(text, ['a', 'b']) == {'a': 'First', 'b': 'Second'}
+
+
+def test_parse_batch_response_strips_code_fence():
+    text = '```json\n[{"row_id": "a", "caption": "Hi"}]\n```'
+    assert parse_batch_response(text, ['a']) == {'a': 'Hi'}
+
+
+def test_parse_batch_response_skips_malformed_entries():
+    text = json.dumps([
+        {'row_id': 'a', 'caption': ''},
+        {'row_id': 'b', 'caption': 42},
+        'c',
+        {'row_id': 'd', 'caption': 'First'},
+        {'row_id': 'd', 'caption': 'Duplicate'},
+    ])
+    assert parse_batch_response(text, ['a', 'b', 'c', 'd']) == {'d': 'First'}
+
+
+def test_parse_batch_response_rejects_non_arrays():
+    assert parse_batch_response('not json', ['a']) == {}
+    assert parse_batch_response('{"row_id": "a", "caption": "Hi"}', ['a']) == {}
+    assert parse_batch_response(None, ['a']) == {}
+
+
+def test_caption_prompt_scope_and_topic():
+    prompt = build_caption_prompt({'brand_name': 'Acme', 'platform_type': 'Instagram',
+                                   'content': 'Launch', 'prompt': 'New shoes'})
+    assert prompt.startswith('You are a social media copywriter.')
+    assert prompt.scope == 'Acme\nInstagram'
+    assert prompt.topic == 'Launch\nNew shoes'
@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+
+from generation_engine import PrioritySemaphore, SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_release_hands_slot_to_most_urgent_waiter():
+    async def scenario():
+        sem = PrioritySemaphore(1)
+        await sem.acquire(10)
+        order = []
+
+        async def waiter(name, priority):
+            await sem.acquire(priority)
+            order.append(name)
+
+        tasks = [asyncio.ensure_future(waiter('bulk-1', 10)),
+                 asyncio.ensure_future(waiter('bulk-2', 10)),
+                 asyncio.ensure_future(waiter('interactive', 0))]
+        await settle()
+        assert sem.depth() == {0: (1, 0), 10: (2, 0)}
+        for _ in range(3):
+            sem.release()
+            await settle()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert run(scenario()) == ['interactive', 'bulk-1', 'bulk-2']
+
+
+def test_new_caller_does_not_jump_queued_waiters():
+    async def scenario():
+        sem = PrioritySemaphore(1)
+        await sem.acquire(10)
+        waiter = asyncio.ensure_future(sem.acquire(0))
+        await settle()
+        sem.release()
+        # The freed slot went to the waiter, not back to the pool
+        late = asyncio.ensure_future(sem.acquire(0))
+        await settle()
+        assert waiter.done() and not late.done()
+        late.cancel()
+
+    run(scenario())
+
+
+def test_resize_grows_by_waking_waiters_and_shrinks_on_release():
+    async def scenario():
+        sem = PrioritySemaphore(1)
+        await sem.acquire(10)
+        waiters = [asyncio.ensure_future(sem.acquire(10)) for _ in range(2)]
+        await settle()
+        sem.resize(3)
+        await settle()
+        assert all(w.done() for w in waiters)
+
+        sem.resize(1)
+        # Three slots are held; two releases pay back the shrink before one frees up
+        sem.release()
+        sem.release()
+        blocked = asyncio.ensure_future(sem.acquire(10))
+        await settle()
+        assert not blocked.done()
+        sem.release()
+        await settle()
+        assert blocked.done()
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue_and_slot_goes_to_next():
+    async def scenario():
+        sem = PrioritySemaphore(1)
+        await sem.acquire(10)
+        first = asyncio.ensure_future(sem.acquire(0))
+        second = asyncio.ensure_future(sem.acquire(10))
+        await settle()
+        first.cancel()
+        await settle()
+        assert sem.depth() == {10: (1, 0)}
+        sem.release()
+        await settle()
+        assert second.done()
+
+    run(scenario())
+
+
+def test_waiter_cancelled_after_handover_passes_slot_on():
+    async def scenario():
+        sem = PrioritySemaphore(1)
+        await sem.acquire(10)
+        first = asyncio.ensure_future(sem.acquire(0))
+        second = asyncio.ensure_future(sem.acquire(10))
+        await settle()
+        # Hand the slot to `first` and cancel it before it gets to run
+        sem.release()
+        first.cancel()
+        await settle()
+        assert first.cancelled()
+        assert second.done()
+
+    run(scenario())
+
+
+def test_single_flight_shares_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+        gate = asyncio.Event()
+
+        async def call():
+            calls.append(1)
+            await gate.wait()
+            return 'caption'
+
+        tasks = [asyncio.ensure_future(flight.do('key', call)) for _ in range(3)]
+        await settle()
+        gate.set()
+        results = await asyncio.gather(*tasks)
+        return results, len(calls), flight.stats()
+
+    results, calls, stats = run(scenario())
+    assert results == ['caption'] * 3
+    assert calls == 1
+    assert stats == {'calls': 1, 'coalesced': 2}
+
+
+def test_single_flight_survives_one_caller_cancelling():
+    async def scenario():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def call():
+            await gate.wait()
+            return 'caption'
+
+        first = asyncio.ensure_future(flight.do('key', call))
+        second = asyncio.ensure_future(flight.do('key', call))
+        await settle()
+        first.cancel()
+        await settle()
+        gate.set()
+        return await second
+
+    assert run(scenario()) == 'caption'
+
+
+def test_single_flight_last_cancel_drops_entry_so_next_call_starts_afresh():
+    async def scenario():
+        flight = SingleFlight()
+        started = []
+
+        async def call():
+            started.append(1)
+            await asyncio.sleep(0 if len(started) > 1 else 10)
+            return len(started)
+
+        first = asyncio.ensure_future(flight.do('key', call))
+        await settle()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await flight.do('key', call)
+
+    assert run(scenario()) == 2
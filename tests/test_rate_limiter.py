@@ -0,0 +1,35 @@
+import types
+
+from rate_limiter import is_rate_limit_error, retry_after_hint
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+def test_rate_limit_error_detection():
+    assert is_rate_limit_error(ResourceExhausted('quota'))
+    assert is_rate_limit_error(RuntimeError('HTTP 429 Too Many Requests'))
+    assert is_rate_limit_error(RuntimeError('Quota exceeded for metric'))
+    # 429 only as a whole number, not inside ids or sizes
+    assert not is_rate_limit_error(RuntimeError('request 14290 failed'))
+    assert not is_rate_limit_error(RuntimeError('connection reset'))
+
+
+def test_retry_after_header():
+    exc = RuntimeError('429')
+    exc.response = types.SimpleNamespace(headers={'Retry-After': '7'})
+    assert retry_after_hint(exc) == 7.0
+
+
+def test_retry_info_details():
+    exc = ResourceExhausted('429')
+    delay = types.SimpleNamespace(seconds=12, nanos=500_000_000)
+    exc.details = [types.SimpleNamespace(), types.SimpleNamespace(retry_delay=delay)]
+    assert retry_after_hint(exc) == 12.5
+
+
+def test_retry_hint_from_message():
+    assert retry_after_hint(RuntimeError('429 quota [violations {\n} , retry_delay {\n  seconds: 44\n}\n]')) == 44.0
+    assert retry_after_hint(RuntimeError('Please retry in 12.5s.')) == 12.5
+    assert retry_after_hint(RuntimeError('429 quota exceeded')) is None
@@ -0,0 +1,80 @@
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, HedgePolicy
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def open_breaker(threshold=2, reset_timeout=30):
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=reset_timeout)
+    for _ in range(threshold):
+        breaker.check()
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = open_breaker()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = open_breaker()
+    clock[0] += 31
+    assert breaker.state == 'half-open'
+    assert breaker.check() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.check() is False
+
+
+def test_failed_probe_reopens(clock):
+    breaker = open_breaker()
+    clock[0] += 31
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock[0] += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_released_probe_lets_another_call_probe(clock):
+    breaker = open_breaker()
+    clock[0] += 31
+    assert breaker.check() is True
+    breaker.release_probe()
+    assert breaker.state == 'half-open'
+    assert breaker.check() is True
+
+
+def test_hedge_waits_for_history():
+    hedge = HedgePolicy(min_samples=3, min_delay=0.5)
+    hedge.observe(1.0)
+    assert hedge.delay() is None
+    for seconds in (2.0, 3.0):
+        hedge.observe(seconds)
+    assert hedge.delay() == 3.0
+
+
+def test_hedge_budget_caps_duplicates():
+    hedge = HedgePolicy(budget=0.1)
+    for _ in range(9):
+        hedge.record_request()
+    assert hedge.try_hedge() is False
+    hedge.record_request()
+    assert hedge.try_hedge() is True
+    assert hedge.try_hedge() is False
+    assert hedge.stats()['hedged'] == 1
+    assert hedge.stats()['denied'] == 2
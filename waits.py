@@ -0,0 +1,155 @@
+import time
+
+# Locators shared by every uploader. Selenium's By.XPATH is the plain string
+# "xpath", so these work without importing selenium here.
+XPATH = "xpath"
+NEW_POST_BUTTON = "//*[@aria-label='New post']"
+FILE_INPUT = "//input[@type='file']"
+CAPTION_EDITOR = "//*[@data-lexical-editor='true']"
+
+
+class StepTimeout(TimeoutError):
+    """Raised when a step's precondition is not met before its deadline."""
+
+
+class StepWaiter:
+    """
+    Polls DOM preconditions instead of sleeping a fixed amount between steps.
+
+    Every call to until() records how long the step really waited, so slow
+    steps show up in the logs instead of hiding inside a fixed sleep.
+    """
+
+    def __init__(self, driver=None, timeout=20, poll_interval=0.25, on_step=None, stop_event=None):
+        """
+        Args:
+            driver: Selenium WebDriver (may be assigned later)
+            timeout (float): Default deadline per step in seconds
+            poll_interval (float): Seconds between condition checks
+            on_step (callable): Called as on_step(step, elapsed, ok) after each wait
+            stop_event (threading.Event): Aborts the wait early when set
+        """
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.on_step = on_step
+        self.stop_event = stop_event
+        self.timings = []
+
+    def until(self, step, condition, timeout=None, raise_on_timeout=True):
+        """
+        Poll condition(driver) until it returns something truthy.
+
+        Args:
+            step (str): Step name used in timings and error messages
+            condition (callable): Takes the driver, returns a truthy value when ready
+            timeout (float): Deadline for this step (defaults to self.timeout)
+            raise_on_timeout (bool): Raise StepTimeout, otherwise return None
+
+        Returns:
+            The condition's truthy result, or None on a tolerated timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        last_error = None
+        while True:
+            try:
+                result = condition(self.driver)
+                if result:
+                    self._record(step, time.monotonic() - start, True)
+                    return result
+            except Exception as e:
+                # Stale elements and half-rendered dialogs are expected mid-transition
+                last_error = e
+            if self.stop_event is not None and self.stop_event.is_set():
+                self._record(step, time.monotonic() - start, False)
+                raise StepTimeout(f"{step}: stopped")
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+        self._record(step, time.monotonic() - start, False)
+        if not raise_on_timeout:
+            return None
+        detail = f" (last error: {last_error})" if last_error else ""
+        raise StepTimeout(f"{step}: not ready after {timeout:.1f}s{detail}")
+
+    def _record(self, step, elapsed, ok):
+        self.timings.append((step, elapsed, ok))
+        if self.on_step:
+            try:
+                self.on_step(step, elapsed, ok)
+            except Exception:
+                pass
+
+    def reset(self):
+        self.timings = []
+
+    def total(self):
+        return sum(elapsed for _, elapsed, _ in self.timings)
+
+    def summary(self):
+        """One-line summary such as 'new_post 0.31s, file_input 0.12s (total 0.43s)'."""
+        if not self.timings:
+            return "no waits recorded"
+        parts = [f"{step} {elapsed:.2f}s" + ("" if ok else " (timeout)") for step, elapsed, ok in self.timings]
+        return ", ".join(parts) + f" (total {self.total():.2f}s)"
+
+
+# CONDITIONS
+# Each factory returns a callable taking the driver, for use with StepWaiter.until
+
+def element_present(xpath):
+    def _condition(driver):
+        found = driver.find_elements(XPATH, xpath)
+        return found[0] if found else False
+    return _condition
+
+
+def element_visible(xpath):
+    def _condition(driver):
+        for el in driver.find_elements(XPATH, xpath):
+            if el.is_displayed():
+                return el
+        return False
+    return _condition
+
+
+def element_clickable(xpath):
+    def _condition(driver):
+        for el in driver.find_elements(XPATH, xpath):
+            if el.is_displayed() and el.is_enabled():
+                return el
+        return False
+    return _condition
+
+
+def element_absent(xpath):
+    def _condition(driver):
+        return not driver.find_elements(XPATH, xpath)
+    return _condition
+
+
+def cookie_present(name):
+    def _condition(driver):
+        return driver.get_cookie(name) or False
+    return _condition
+
+
+def url_excludes(fragment):
+    def _condition(driver):
+        return fragment not in driver.current_url
+    return _condition
+
+
+def any_of(*conditions):
+    def _condition(driver):
+        for condition in conditions:
+            try:
+                result = condition(driver)
+            except Exception:
+                continue
+            if result:
+                return result
+        return False
+    return _condition